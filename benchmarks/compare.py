@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+
+"""Compare two result files written by ``run_benchmarks.py``.
+
+Prints the ratio of the minimum timings of every benchmark and exits
+with a non-zero status if any benchmark is slower than the given
+threshold.
+
+"""
+
+import sys
+import json
+import argparse
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('baseline', help="JSON results of the baseline.")
+    parser.add_argument('contender', help="JSON results to compare.")
+    parser.add_argument('--threshold', type=float, default=1.1,
+                        help="(default=1.1) Report a regression if the "
+                        "ratio contender/baseline exceeds this value.")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.contender) as f:
+        contender = json.load(f)
+
+    for name, results in (('baseline', baseline), ('contender', contender)):
+        meta = results['metadata']
+        print '%-10s %s (numpy %s, pysam %s, python %s)' % (
+            name, meta.get('git_revision') or meta['bento_seq'],
+            meta['numpy'], meta['pysam'], meta['python'])
+    print
+
+    regressions = []
+    print '%-30s %12s %12s %8s' % ('benchmark', 'baseline', 'contender', 'ratio')
+    for key in sorted(set(baseline['benchmarks']) & set(contender['benchmarks'])):
+        t_base = baseline['benchmarks'][key]['min']
+        t_cont = contender['benchmarks'][key]['min']
+        ratio = t_cont / t_base if t_base else float('inf')
+        flag = ''
+        if ratio > args.threshold:
+            flag = ' *'
+            regressions.append(key)
+        print '%-30s %11.4fs %11.4fs %7.2fx%s' % (key, t_base, t_cont, ratio, flag)
+
+    if regressions:
+        print
+        print '%d benchmark(s) slower than %.2fx: %s' % (
+            len(regressions), args.threshold, ', '.join(regressions))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
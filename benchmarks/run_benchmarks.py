@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+
+"""Run the BENTO-Seq benchmark suite on synthetic data and write the
+timings as JSON.
+
+The suite times
+
+* ``from_junction``: building the read distribution of every junction
+  of the synthetic events, separately for STAR and TopHat BAM-files,
+* ``gen_pdf``: the bootstrap of every event at several settings of
+  ``-S``/``--n-bootstrap-samples`` and ``-G``/``--n-grid-points``,
+* ``process_event_file``: an end-to-end run of ``bin/bento-seq``,
+* ``startup``: the start-up time of ``bin/bento-seq`` for ``--help``
+  and the light-weight commands. That these do not import pysam or
+  NumPy is tested in ``tests/test_startup.py``.
+
+Results of two runs (*e.g.* two commits or two versions of pysam or
+NumPy) can be compared with ``benchmarks/compare.py``.
+
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import imp
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+import numpy as np
+import pysam
+import synthetic
+from bento_seq.alt_splice_event import AltSpliceEvent
+from bento_seq.read_distribution import ReadDistribution
+from bento_seq.bootstrap import gen_pdf
+from bento_seq.version import version
+
+BOOTSTRAP_SETTINGS = [(100, 100), (1000, 100), (1000, 1000), (5000, 100)]
+
+CLI = os.path.join(ROOT_DIR, 'bin', 'bento-seq')
+
+# Commands that start without importing the heavy dependencies
+LIGHT_COMMANDS = [['--help'], ['fetch', '--help'], ['split', '--help'],
+                  ['merge', '--help'], ['validate', '--help']]
+
+
+def timeit(func, repeat):
+    """Call ``func`` ``repeat`` times and return the timings in
+    seconds."""
+
+    timings = []
+    for _ in range(repeat):
+        t0 = time.time()
+        func()
+        timings.append(time.time() - t0)
+    return timings
+
+
+def summarize(timings, n_items=None):
+    result = {'min': min(timings),
+              'median': float(np.median(timings)),
+              'max': max(timings),
+              'repeat': len(timings)}
+    if n_items:
+        result['n_items'] = n_items
+        result['per_item'] = result['min'] / n_items
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR,
+            stderr=open(os.devnull, 'w')).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_events(dataset):
+    return [AltSpliceEvent('CAS', event_id, synthetic.CHROMOSOME, '+', exons)
+            for event_id, exons in dataset['events']]
+
+
+def bench_from_junction(dataset, repeat):
+    events = load_events(dataset)
+    junctions = [junction for event in events for junction in event.junctions]
+    results = {}
+    for mapper in ('STAR', 'TopHat'):
+        bamfiles = [pysam.Samfile(dataset[mapper], check_header=False)]
+
+        def run():
+            for junction in junctions:
+                ReadDistribution.from_junction(bamfiles, junction)
+
+        results['from_junction.%s' % mapper] = \
+            summarize(timeit(run, repeat), len(junctions))
+        bamfiles[0].close()
+    return results
+
+
+def bench_gen_pdf(dataset, repeat):
+    events = load_events(dataset)
+    bamfiles = [pysam.Samfile(dataset['STAR'], check_header=False)]
+    reads = []
+    for event in events:
+        event.build_read_distribution(bamfiles)
+        reads.append((np.array(event.reads_inc), np.array(event.reads_exc)))
+    bamfiles[0].close()
+
+    results = {}
+    for n_bootstrap_samples, n_grid_points in BOOTSTRAP_SETTINGS:
+        def run():
+            for reads_inc, reads_exc in reads:
+                gen_pdf(reads_inc, reads_exc,
+                        n_bootstrap_samples, n_grid_points)
+
+        results['gen_pdf.S%d.G%d' % (n_bootstrap_samples, n_grid_points)] = \
+            summarize(timeit(run, repeat), len(reads))
+    return results
+
+
+def bench_startup(repeat):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ROOT_DIR] + filter(None, [env.get('PYTHONPATH')]))
+    devnull = open(os.devnull, 'w')
+
+    def run(args):
+        subprocess.check_call([sys.executable] + args, env=env,
+                              stdout=devnull, stderr=devnull)
+
+    results = {'startup.interpreter':
+               summarize(timeit(lambda: run(['-c', 'pass']), repeat))}
+    for command in LIGHT_COMMANDS:
+        name = 'startup.' + '.'.join(arg.strip('-') for arg in command)
+        results[name] = summarize(timeit(lambda: run([CLI] + command), repeat))
+    devnull.close()
+    return results
+
+
+def bench_process_event_file(dataset, repeat, workdir):
+    cli = imp.load_source('bento_seq_cli', CLI)
+    args = argparse.Namespace(
+        event_definitions=dataset['event_file'],
+        output_file=os.path.join(workdir, 'results.tab'),
+        bam_files=[dataset['STAR'], dataset['TopHat']],
+        zero_based_coordinates=False,
+        max_edit_distance=2, max_num_mapped_loci=1, min_overhang=5,
+        library_type='unstranded', paired_end=False, junction_table=None,
+        n_bootstrap_samples=1000, n_grid_points=100, a=1, b=1, r=1,
+        stats_file=None, progress_interval=None, event_timings=None,
+        top_k=20, profile_threshold=None, profile_dir=None)
+
+    return {'process_event_file':
+            summarize(timeit(lambda: cli.process_event_file(args), repeat),
+                      len(dataset['events']))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--output', '-o',
+                        help="Name of the JSON file to store the "
+                        "results in. By default, results are written "
+                        "to stdout.")
+    parser.add_argument('--n-events', type=int, default=100,
+                        help="(default=100) Number of synthetic events.")
+    parser.add_argument('--n-reads', type=int, default=100,
+                        help="(default=100) Number of reads generated "
+                        "per junction.")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="(default=3) How often each benchmark "
+                        "is repeated. The minimum is reported.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir',
+                        help="Directory for the synthetic data. By "
+                        "default, a temporary directory is used and "
+                        "deleted afterwards.")
+    parser.add_argument('--only', nargs='+',
+                        choices=('from_junction', 'gen_pdf',
+                                 'process_event_file', 'startup'),
+                        help="Run only the given benchmarks.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level='ERROR')
+
+    only = args.only or ('from_junction', 'gen_pdf', 'process_event_file',
+                         'startup')
+    benchmarks = {}
+    if 'startup' in only:
+        benchmarks.update(bench_startup(args.repeat))
+
+    setup_time = None
+    if set(only) - set(['startup']):
+        workdir = args.workdir or tempfile.mkdtemp(prefix='bento-seq-bench-')
+        try:
+            t0 = time.time()
+            dataset = synthetic.generate_dataset(
+                workdir, args.n_events, args.n_reads, seed=args.seed)
+            setup_time = time.time() - t0
+
+            np.random.seed(args.seed)
+            if 'from_junction' in only:
+                benchmarks.update(bench_from_junction(dataset, args.repeat))
+            if 'gen_pdf' in only:
+                benchmarks.update(bench_gen_pdf(dataset, args.repeat))
+            if 'process_event_file' in only:
+                benchmarks.update(
+                    bench_process_event_file(dataset, args.repeat, workdir))
+        finally:
+            if not args.workdir:
+                shutil.rmtree(workdir)
+
+    results = {
+        'metadata': {
+            'bento_seq': version,
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pysam': getattr(pysam, '__version__', None),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'n_events': args.n_events,
+            'n_reads_per_junction': args.n_reads,
+            'seed': args.seed,
+            'setup_time': setup_time
+        },
+        'benchmarks': benchmarks
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,252 @@
+"""Generate synthetic, indexed BAM-files and matching event
+definitions for benchmarking.
+
+The generated data mimics the output of TopHat (``NM`` tag) and STAR
+(``nM`` tag) and contains the read features that exercise the
+different code paths in
+:py:meth:`bento_seq.read_distribution.ReadDistribution.from_junction`:
+soft-clipping, insertions and deletions (also directly at the splice
+site), multi-mapping reads, reads with a high edit distance, reads
+spanning two junctions, and unspliced reads.
+
+"""
+
+import os
+import random
+import pysam
+
+CHROMOSOME = 'chrB'
+
+# CIGAR operation codes used by pysam
+BAM_CMATCH = 0
+BAM_CINS = 1
+BAM_CDEL = 2
+BAM_CREF_SKIP = 3
+BAM_CSOFT_CLIP = 4
+
+# Operations that consume the reference sequence
+_CONSUMES_REF = (BAM_CMATCH, BAM_CDEL, BAM_CREF_SKIP)
+
+
+def make_events(n_events, read_length=75, seed=0):
+    """Lay out ``n_events`` non-overlapping cassette exon events.
+
+    **Returns:**
+
+    events : list
+        List of ``(event_id, exons)`` where ``exons`` are 0-based,
+        right-open intervals on the forward strand.
+
+    chromosome_length : int
+
+    """
+
+    rng = random.Random(seed)
+    events = []
+    pos = 1000
+    for i in range(n_events):
+        exons = []
+        for j in range(3):
+            # Middle exons are sometimes shorter than a read, so that
+            # some reads span both junctions of the event
+            if j == 1 and rng.random() < .5:
+                length = rng.randint(read_length // 4, read_length // 2)
+            else:
+                length = rng.randint(80, 300)
+            exons.append((pos, pos + length))
+            pos += length + rng.randint(200, 2000)
+        events.append(('SYN%06d' % i, exons))
+        pos += 5000
+    return events, pos
+
+
+def _cigar_length(cigar, ops):
+    return sum(l for op, l in cigar if op in ops)
+
+
+def _spliced_cigars(rng, exons, read_length, anchor_idx, left_len):
+    """Build the CIGAR of a read that crosses the junction between
+    ``exons[anchor_idx]`` and ``exons[anchor_idx + 1]`` with
+    ``left_len`` aligned bases upstream of the junction. Returns
+    ``(pos, cigar)`` or ``None`` if the read does not fit."""
+
+    left_exon = exons[anchor_idx]
+    right_len = read_length - left_len
+    cigar = [(BAM_CMATCH, left_len),
+             (BAM_CREF_SKIP, exons[anchor_idx + 1][0] - left_exon[1])]
+
+    # Continue into a third exon if the read is longer than the
+    # second one
+    right_exon = exons[anchor_idx + 1]
+    if anchor_idx + 2 < len(exons) and \
+       right_len > right_exon[1] - right_exon[0]:
+        middle_len = right_exon[1] - right_exon[0]
+        cigar += [(BAM_CMATCH, middle_len),
+                  (BAM_CREF_SKIP, exons[anchor_idx + 2][0] - right_exon[1]),
+                  (BAM_CMATCH, right_len - middle_len)]
+    else:
+        cigar.append((BAM_CMATCH, right_len))
+
+    variant = rng.random()
+    if variant < .1 and left_len > 10:
+        # Soft-clipping on the left
+        clip = rng.randint(1, 3)
+        cigar = [(BAM_CSOFT_CLIP, clip), (BAM_CMATCH, left_len - clip)] + \
+                cigar[1:]
+    elif variant < .2 and cigar[-1][1] > 10:
+        # Soft-clipping on the right
+        clip = rng.randint(1, 3)
+        cigar = cigar[:-1] + [(BAM_CMATCH, cigar[-1][1] - clip),
+                              (BAM_CSOFT_CLIP, clip)]
+    elif variant < .3 and cigar[-1][1] > 10:
+        # Insertion or deletion downstream of the last junction
+        op = rng.choice((BAM_CINS, BAM_CDEL))
+        before = rng.randint(3, cigar[-1][1] - 4)
+        after = cigar[-1][1] - before
+        if op == BAM_CINS:
+            after -= 1
+        cigar = cigar[:-1] + [(BAM_CMATCH, before), (op, 1),
+                              (BAM_CMATCH, after)]
+    elif variant < .33 and left_len > 2:
+        # Indel directly at the splice site
+        cigar = [(BAM_CMATCH, left_len - 1), (BAM_CINS, 1)] + cigar[1:]
+
+    # Read starts ``left_len`` reference bases upstream of the
+    # junction, minus any soft-clipped bases
+    left_ref_len = 0
+    for op, l in cigar:
+        if op == BAM_CREF_SKIP:
+            break
+        if op in _CONSUMES_REF:
+            left_ref_len += l
+    pos = left_exon[1] - left_ref_len
+    if pos < left_exon[0] - 20:
+        return None
+    return pos, cigar
+
+
+def generate_reads(events, n_reads_per_junction=100, read_length=75,
+                   min_overhang=5, seed=0):
+    """Generate ``(pos, cigar, edit_distance, n_loci)`` records for
+    all junctions of all events, plus a number of unspliced reads.
+    """
+
+    rng = random.Random(seed)
+    reads = []
+    for event_id, exons in events:
+        for anchor_idx in range(len(exons) - 1):
+            for _ in range(n_reads_per_junction):
+                left_len = rng.randint(min_overhang, read_length - min_overhang)
+                r = _spliced_cigars(rng, exons, read_length,
+                                    anchor_idx, left_len)
+                if r is None:
+                    continue
+                pos, cigar = r
+                edit_distance = rng.choice((0, 0, 0, 1, 2, 3))
+                n_loci = 1 if rng.random() < .9 else rng.randint(2, 5)
+                reads.append((pos, cigar, edit_distance, n_loci))
+
+        # Exclusion reads skipping the middle exon
+        for _ in range(n_reads_per_junction // 2):
+            left_len = rng.randint(min_overhang, read_length - min_overhang)
+            r = _spliced_cigars(rng, [exons[0], exons[2]], read_length,
+                                0, left_len)
+            if r is not None:
+                reads.append(r + (rng.choice((0, 0, 1, 3)), 1))
+
+        # Unspliced reads within the exons
+        for exon in exons:
+            for _ in range(n_reads_per_junction // 2):
+                start = rng.randint(exon[0] - read_length // 2, exon[1])
+                reads.append((start, [(BAM_CMATCH, read_length)], 0, 1))
+
+    reads.sort(key=lambda r: r[0])
+    return reads
+
+
+def write_bam(filename, reads, chromosome_length, mapper='STAR',
+              read_length=75, seed=0):
+    """Write reads to a sorted BAM-file and build its index.
+
+    **Parameters:**
+
+    mapper : {'STAR', 'TopHat'}
+        Determines whether the edit distance is stored in the ``nM``
+        (STAR) or ``NM`` (TopHat) tag.
+
+    """
+
+    if mapper == 'STAR':
+        nm_tag = 'nM'
+    elif mapper == 'TopHat':
+        nm_tag = 'NM'
+    else:
+        raise ValueError("Unknown mapper: %s" % mapper)
+
+    rng = random.Random(seed)
+    header = {'HD': {'VN': '1.0', 'SO': 'coordinate'},
+              'SQ': [{'SN': CHROMOSOME, 'LN': chromosome_length}]}
+    outfile = pysam.Samfile(filename, 'wb', header=header)
+    for i, (pos, cigar, edit_distance, n_loci) in enumerate(reads):
+        read = pysam.AlignedRead()
+        read.qname = 'read%08d' % i
+        read.seq = ''.join(rng.choice('ACGT') for _ in range(
+            _cigar_length(cigar, (BAM_CMATCH, BAM_CINS, BAM_CSOFT_CLIP))))
+        read.flag = 16 if rng.random() < .5 else 0
+        read.rname = 0
+        read.pos = pos
+        read.mapq = 255 if n_loci == 1 else 1
+        read.cigar = cigar
+        read.mrnm = -1
+        read.mpos = -1
+        read.isize = 0
+        read.qual = 'I' * len(read.seq)
+        read.tags = [('NH', n_loci), (nm_tag, edit_distance)]
+        outfile.write(read)
+    outfile.close()
+    pysam.index(filename)
+    return filename
+
+
+def write_event_file(filename, events, one_based_pos=True):
+    """Write the events in the tab-separated BENTO-Seq event
+    definition format."""
+
+    offset = 1 if one_based_pos else 0
+    with open(filename, 'w') as f:
+        f.write('#type\tID\tchr\tstrand\te1\te2\te3\n')
+        for event_id, exons in events:
+            f.write('\t'.join(
+                ['CAS', event_id, CHROMOSOME, '+'] +
+                ['%d:%d' % (start + offset, end) for start, end in exons]) + '\n')
+    return filename
+
+
+def generate_dataset(directory, n_events=100, n_reads_per_junction=100,
+                     read_length=75, seed=0):
+    """Generate an event file and one STAR and one TopHat BAM-file in
+    ``directory``.
+
+    **Returns:**
+
+    dataset : dict
+        Dictionary with the keys ``'events'``, ``'event_file'``,
+        ``'STAR'``, and ``'TopHat'``.
+
+    """
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    events, chromosome_length = make_events(n_events, read_length, seed)
+    reads = generate_reads(events, n_reads_per_junction, read_length,
+                           seed=seed)
+
+    dataset = {'events': events,
+               'event_file': write_event_file(
+                   os.path.join(directory, 'events.tab'), events)}
+    for mapper in ('STAR', 'TopHat'):
+        dataset[mapper] = write_bam(
+            os.path.join(directory, '%s.bam' % mapper), reads,
+            chromosome_length, mapper, read_length, seed)
+    return dataset
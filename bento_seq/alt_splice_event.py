@@ -2,6 +2,7 @@ import numpy as np
 import pysam, logging
 from .read_distribution import ReadDistribution
 from .bootstrap import gen_pdf
+from .instrumentation import stage
 from . import BENTOSeqError
 
 class AltSpliceEvent(object):
@@ -138,7 +139,10 @@ class AltSpliceEvent(object):
 
     def build_read_distribution(self, bamfiles, min_overhang=5,
                                 max_edit_distance=2,
-                                max_num_mapped_loci=1):
+                                max_num_mapped_loci=1,
+                                library_type='unstranded',
+                                paired_end=False, stats=None,
+                                junction_cache=None):
 
         """Build the read distribution for this event from a BAM-file.
 
@@ -160,15 +164,42 @@ class AltSpliceEvent(object):
             be a counted. By default, only uniquely mappable reads are
             alowed.
 
+        library_type : {'unstranded', 'fr-firststrand', 'fr-secondstrand'} (default='unstranded')
+            For stranded libraries, only reads originating from the
+            strand of the event are counted.
+
+        paired_end : bool (default=False)
+            Count every read pair only once per junction.
+
+        stats : :class:`bento_seq.instrumentation.Instrumentation` (optional)
+            If given, record timings and read counters.
+
+        junction_cache : :class:`bento_seq.read_distribution.JunctionCache` (optional)
+            If given, read distributions are looked up in and added to
+            the cache. The cache must only be used with one set of
+            BAM-files.
+
         """
     
         self.junction_read_distributions = []
         for junction in self.junctions:
-            read_distribution = \
-                ReadDistribution.from_junction(
-                    bamfiles, junction,
-                    max_edit_distance,
-                    max_num_mapped_loci)
+            read_distribution = None
+            if junction_cache is not None:
+                cache_key = (junction, max_edit_distance, max_num_mapped_loci,
+                             library_type,
+                             self.strand if library_type != 'unstranded' else None,
+                             paired_end)
+                read_distribution = junction_cache.get(cache_key)
+
+            if read_distribution is None:
+                read_distribution = \
+                    ReadDistribution.from_junction(
+                        bamfiles, junction,
+                        max_edit_distance,
+                        max_num_mapped_loci, library_type,
+                        self.strand, paired_end, stats)
+                if junction_cache is not None:
+                    junction_cache.put(cache_key, read_distribution)
 
             if read_distribution.is_empty:
                 logging.debug("Event %s: No reads in BAM-files "
@@ -183,6 +214,13 @@ class AltSpliceEvent(object):
             if self.strand == '-': reads = reads[::-1]
             self.junction_read_distributions.append(reads)
 
+        with stage(stats, 'trim_reads'):
+            self._combine_junctions(read_length, min_overhang)
+
+    def _combine_junctions(self, read_length, min_overhang):
+        """Combine the junction read distributions into inclusion and
+        exclusion reads. """
+
         if self.event_type == 'CAS':
             self.junction_read_distributions[0] = self.trim_reads(
                 self.junction_read_distributions[0], read_length,
@@ -309,6 +347,9 @@ class AltSpliceEvent(object):
 
         psi_bootstrap_std : float
             Estimated standard deviation of ``psi_bootstrap``.
+
+        The bootstrap probability density function and its grid are
+        stored in the attributes ``pdf`` and ``grid``.
         """
     
         reads_inc = np.array(self.reads_inc)
@@ -328,6 +369,8 @@ class AltSpliceEvent(object):
 
         pdf, grid = gen_pdf(reads_inc, reads_exc,
                             n_bootstrap_samples, n_grid_points, a, b, r)
+        self.pdf = pdf
+        self.grid = grid
 
         psi_bootstrap = np.sum(pdf * grid)
         psi_std = np.sqrt(np.sum(pdf * np.square(grid - psi_bootstrap)))
@@ -1,10 +1,6 @@
 import numpy as np
 from  numpy import newaxis as na
-from datetime import datetime
-from itertools import izip
 
-tstart = datetime.now()
-    
 def gen_pdf(inc, exc, n_bootstrap_samples=1000, n_grid_points=100, a=1., b=1., r=0.):
     """Generate bootstrap PDF of PSI"""
 
@@ -0,0 +1,221 @@
+"""Differential PSI between two conditions.
+
+The bootstrap probability density functions of PSI are computed for
+both conditions in a single pass over the events. Assuming
+independence of the conditions, the density of
+``delta_psi = psi_b - psi_a`` is the cross-correlation of the two
+densities on the PSI grid, which is computed for all events at once.
+Densities can be saved and reused, so that the bootstrap does not
+need to be run again, *e.g.* to compare a condition against several
+others.
+
+"""
+
+import logging
+import numpy as np
+
+from . import BENTOSeqError
+from .alt_splice_event import AltSpliceEvent
+from .load_as_event_data import open_event_file, open_file, parse_event_line
+
+
+def delta_psi_pdf(pdf_a, pdf_b):
+    """Compute the probability density function of
+    ``psi_b - psi_a``.
+
+    **Parameters:**
+
+    pdf_a, pdf_b : array_like
+        Densities of PSI on the same grid of ``n`` points, either as
+        vectors or as matrices with one event per row.
+
+    **Returns:**
+
+    pdf : :py:class:`numpy.ndarray`
+        Density of delta PSI with ``2 * n - 1`` points (per row).
+
+    grid : :py:class:`numpy.ndarray`
+        The delta PSI values ``(-(n - 1), ..., n - 1) / n``.
+
+    """
+
+    squeeze = np.ndim(pdf_a) == 1
+    pdf_a = np.atleast_2d(pdf_a)
+    pdf_b = np.atleast_2d(pdf_b)
+    if pdf_a.shape != pdf_b.shape:
+        raise ValueError("Densities must have the same shape.")
+
+    n = pdf_a.shape[1]
+    n_fft = 2 * n - 1
+    # P(delta = k) = sum_i pdf_a[i] * pdf_b[i + k], computed as a
+    # convolution with the reversed density of condition A
+    pdf = np.fft.irfft(np.fft.rfft(pdf_b, n_fft, axis=1) *
+                       np.fft.rfft(pdf_a[:, ::-1], n_fft, axis=1),
+                       n_fft, axis=1)
+    pdf = np.clip(pdf, 0, None)
+    pdf /= pdf.sum(1)[:, np.newaxis]
+    grid = np.arange(-(n - 1), n) / float(n)
+
+    if squeeze:
+        pdf = pdf[0]
+    return pdf, grid
+
+
+def summarize_delta_psi(pdf, grid, thresholds=(0.1,)):
+    """Compute the expected delta PSI, its standard deviation, and
+    ``P(|delta_psi| > t)`` for every threshold ``t``.
+
+    **Parameters:**
+
+    pdf : :py:class:`numpy.ndarray`
+        Densities of delta PSI, one event per row, as returned by
+        :py:func:`delta_psi_pdf`.
+
+    grid : :py:class:`numpy.ndarray`
+
+    thresholds : list of floats (default=(0.1,))
+
+    **Returns:**
+
+    delta_psi, delta_psi_std : :py:class:`numpy.ndarray`
+
+    p_change : :py:class:`numpy.ndarray`
+        Matrix with one column per threshold.
+
+    """
+
+    pdf = np.atleast_2d(pdf)
+    delta_psi = pdf.dot(grid)
+    delta_psi_std = np.sqrt(np.maximum(
+        pdf.dot(np.square(grid)) - np.square(delta_psi), 0))
+    p_change = np.column_stack(
+        [pdf[:, np.abs(grid) > t].sum(1) for t in thresholds])
+    return delta_psi, delta_psi_std, p_change
+
+
+def write_pdfs(filename, event_ids, pdfs):
+    """Write densities to a tab-separated file with the event ID and
+    the comma-separated density values per line. Compressed with gzip
+    if ``filename`` ends in ``gz``."""
+
+    with open_file(filename, 'w') as f:
+        f.write('#ID\tpdf\n')
+        for event_id, pdf in zip(event_ids, pdfs):
+            f.write('%s\t%s\n' % (event_id, ','.join('%.6g' % p for p in pdf)))
+
+
+def read_pdfs(filename):
+    """Read densities written by :py:func:`write_pdfs`.
+
+    **Returns:**
+
+    pdfs : dict
+        Dictionary mapping event IDs to densities.
+
+    """
+
+    pdfs = {}
+    with open_file(filename) as f:
+        for line in f:
+            if line.startswith('#') or not line.strip():
+                continue
+            event_id, values = line.rstrip('\n').split('\t')
+            pdfs[event_id] = np.array(map(float, values.split(',')))
+    return pdfs
+
+
+def _bootstrap_pdf(event, bamfiles, options):
+    event.build_read_distribution(
+        bamfiles, options['min_overhang'], options['max_edit_distance'],
+        options['max_num_mapped_loci'], options['library_type'],
+        options['paired_end'])
+    event.bootstrap_event(options['n_bootstrap_samples'],
+                          options['n_grid_points'],
+                          options['a'], options['b'], options['r'])
+    return event.pdf
+
+
+def compute_condition_pdfs(event_string, bamfiles_a=None, bamfiles_b=None,
+                           pdfs_a=None, pdfs_b=None, one_based_pos=True,
+                           **options):
+    """Compute the bootstrap densities of PSI of both conditions in a
+    single pass over the events.
+
+    **Parameters:**
+
+    event_string : string
+        Path of the event definitions file or a genome identifier.
+
+    bamfiles_a, bamfiles_b : list of :py:class:`pysam.Samfile`
+        BAM-files of the two conditions. Not required for a condition
+        whose densities are given.
+
+    pdfs_a, pdfs_b : dict (optional)
+        Saved densities as returned by :py:func:`read_pdfs`. Events
+        without a saved density are skipped.
+
+    one_based_pos : bool (default=True)
+
+    options
+        Counting and bootstrap parameters: ``min_overhang``,
+        ``max_edit_distance``, ``max_num_mapped_loci``,
+        ``library_type``, ``paired_end``, ``n_bootstrap_samples``,
+        ``n_grid_points``, ``a``, ``b``, ``r``.
+
+    **Returns:**
+
+    event_ids : list of strings
+
+    pdf_a, pdf_b : :py:class:`numpy.ndarray`
+        Densities with one event per row.
+
+    """
+
+    if pdfs_a is None and not bamfiles_a or pdfs_b is None and not bamfiles_b:
+        raise ValueError("Either BAM-files or densities are required "
+                         "for both conditions.")
+
+    event_ids = []
+    rows_a = []
+    rows_b = []
+    with open_event_file(event_string) as f:
+        for i_line, line in enumerate(f):
+            if line.startswith('#') or not line.strip(): continue
+
+            try:
+                event = AltSpliceEvent(*parse_event_line(line),
+                                       one_based_pos=one_based_pos)
+
+                # Look up saved densities first, so that the other
+                # condition is not bootstrapped in vain
+                pdf_a = pdf_b = None
+                if pdfs_a is not None:
+                    pdf_a = pdfs_a.get(event.event_id)
+                if pdfs_b is not None:
+                    pdf_b = pdfs_b.get(event.event_id)
+                if pdfs_a is not None and pdf_a is None or \
+                   pdfs_b is not None and pdf_b is None:
+                    logging.debug("Event %s: no saved density, skipping." %
+                                  event.event_id)
+                    continue
+
+                if pdf_a is None:
+                    pdf_a = _bootstrap_pdf(event, bamfiles_a, options)
+                if pdf_b is None:
+                    pdf_b = _bootstrap_pdf(event, bamfiles_b, options)
+            except BENTOSeqError as e:
+                logging.info("Input error in line %d: skipping event." %
+                             (i_line + 1))
+                logging.debug(e)
+                continue
+            if pdf_a.size != pdf_b.size:
+                raise BENTOSeqError(
+                    "Event %s: densities have different numbers of grid "
+                    "points (%d and %d)." % (event.event_id, pdf_a.size,
+                                             pdf_b.size))
+
+            event_ids.append(event.event_id)
+            rows_a.append(pdf_a)
+            rows_b.append(pdf_b)
+
+    return event_ids, np.array(rows_a), np.array(rows_b)
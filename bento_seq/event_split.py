@@ -0,0 +1,261 @@
+"""Split event definition files into shards for distributed runs and
+merge the results of the shards.
+
+Events can be sharded by chromosome or into chunks that are balanced
+by the expected cost of an event. The cost of an event is estimated
+from its number of junctions and, if BAM-files are given, the read
+density of its chromosome from the BAM index statistics.
+
+"""
+
+import os
+import heapq
+import logging
+from collections import defaultdict
+
+from . import BENTOSeqError
+from .load_as_event_data import open_event_file, open_file
+
+
+def read_events(event_string):
+    """Read an event definitions file.
+
+    **Returns:**
+
+    header : list of strings
+        Comment lines at the top of the file.
+
+    events : list
+        List of ``(line, event_type, event_id, chromosome)`` in file
+        order.
+
+    """
+
+    header = []
+    events = []
+    with open_event_file(event_string) as f:
+        for line in f:
+            if line.startswith('#'):
+                if not events:
+                    header.append(line)
+                continue
+            if not line.strip():
+                continue
+            elements = line.split('\t', 4)
+            if len(elements) < 4:
+                raise BENTOSeqError("Malformed event definition: %s" %
+                                    line.rstrip())
+            events.append((line, elements[0].upper(), elements[1],
+                           elements[2]))
+    return header, events
+
+
+def read_density(bam_files):
+    """Mapped reads per kb for every chromosome, summed over
+    ``bam_files``, from the BAM index statistics."""
+
+    import pysam
+
+    density = defaultdict(float)
+    for bam_file in bam_files:
+        stats = pysam.idxstats(bam_file)
+        if isinstance(stats, basestring):
+            stats = stats.splitlines()
+        for line in stats:
+            chromosome, length, mapped = line.split('\t')[:3]
+            if int(length):
+                density[chromosome] += 1000. * int(mapped) / int(length)
+    return density
+
+
+def event_costs(events, density=None):
+    """Estimate the cost of every event as the number of junctions,
+    weighted by ``1 + density`` of the chromosome if ``density`` is
+    given."""
+
+    costs = []
+    for line, event_type, event_id, chromosome in events:
+        n_junctions = 5 if event_type == 'MXE' else 3
+        if density is not None:
+            costs.append(n_junctions * (1. + density.get(chromosome, 0.)))
+        else:
+            costs.append(float(n_junctions))
+    return costs
+
+
+def _assign_balanced(costs, n_shards):
+    """Greedily assign items to the shard with the lowest load, largest
+    items first."""
+
+    loads = [(0., shard) for shard in range(n_shards)]
+    assignment = [None] * len(costs)
+    for i in sorted(range(len(costs)), key=lambda i: -costs[i]):
+        load, shard = heapq.heappop(loads)
+        assignment[i] = shard
+        heapq.heappush(loads, (load + costs[i], shard))
+    return assignment
+
+
+def split_event_file(event_string, output_prefix, n_shards=None,
+                     by='balanced', bam_files=None, compress=False):
+    """Split an event definitions file into shards.
+
+    **Parameters:**
+
+    event_string : string
+        Path of the event definitions file or a genome identifier.
+
+    output_prefix : string
+        Shards are written to ``output_prefix.000.tab``,
+        ``output_prefix.001.tab``, ...
+
+    n_shards : int (optional)
+        Number of shards. Required if ``by='balanced'``. If
+        ``by='chromosome'`` and ``n_shards`` is not given, every
+        chromosome is written to its own shard. Exactly ``n_shards``
+        shards are written, even if there are fewer events or
+        chromosomes, in which case some shards contain only the
+        header.
+
+    by : {'balanced', 'chromosome'} (default='balanced')
+        Whether to balance individual events across shards or to keep
+        all events of a chromosome in the same shard.
+
+    bam_files : list of strings (optional)
+        If given, the cost of an event is weighted by the read density
+        of its chromosome.
+
+    compress : bool (default=False)
+        Write gzip-compressed shards.
+
+    **Returns:**
+
+    shards : list of strings
+        File names of the shards that were written.
+
+    """
+
+    if by not in ('balanced', 'chromosome'):
+        raise ValueError("Unknown split mode: %s" % by)
+    if n_shards is not None and n_shards < 1:
+        raise ValueError("n_shards must be at least 1.")
+    if by == 'balanced' and not n_shards:
+        raise ValueError("n_shards is required for balanced splitting.")
+
+    header, events = read_events(event_string)
+    density = read_density(bam_files) if bam_files else None
+    costs = event_costs(events, density)
+
+    if by == 'balanced':
+        assignment = _assign_balanced(costs, n_shards)
+    else:
+        chromosomes = []
+        chromosome_costs = defaultdict(float)
+        for (line, event_type, event_id, chromosome), cost in zip(events, costs):
+            if chromosome not in chromosome_costs:
+                chromosomes.append(chromosome)
+            chromosome_costs[chromosome] += cost
+
+        if n_shards:
+            chromosome_shards = dict(zip(
+                chromosomes,
+                _assign_balanced([chromosome_costs[c] for c in chromosomes],
+                                 n_shards)))
+        else:
+            chromosome_shards = dict((c, i) for i, c in enumerate(chromosomes))
+        assignment = [chromosome_shards[event[3]] for event in events]
+
+    if not n_shards:
+        n_shards = max(assignment) + 1 if assignment else 0
+    extension = '.tab.gz' if compress else '.tab'
+    shards = ['%s.%03d%s' % (output_prefix, i, extension)
+              for i in range(n_shards)]
+    shard_costs = [0.] * n_shards
+    outputs = [open_file(shard, 'w') for shard in shards]
+    try:
+        for output in outputs:
+            output.writelines(header)
+        for (line, event_type, event_id, chromosome), shard, cost in \
+                zip(events, assignment, costs):
+            outputs[shard].write(line if line.endswith('\n') else line + '\n')
+            shard_costs[shard] += cost
+    finally:
+        for output in outputs:
+            output.close()
+
+    for shard, cost in zip(shards, shard_costs):
+        logging.debug("Shard %s: estimated cost %.1f." % (shard, cost))
+    n_empty = len(set(range(n_shards)) - set(assignment))
+    if n_empty:
+        logging.warning("%d of %d shards contain no events." %
+                        (n_empty, n_shards))
+    logging.info("Split %d events into %d shards." % (len(events), n_shards))
+    return shards
+
+
+def merge_outputs(event_string, output_files, merged_file,
+                  allow_missing=False):
+    """Merge the outputs of sharded runs in the order of the original
+    event definitions file.
+
+    Raises :py:exc:`bento_seq.BENTOSeqError` if an event is present
+    more than once, if an event is not part of the event definitions,
+    or if an event is missing and ``allow_missing`` is False.
+
+    **Returns:**
+
+    missing : list of strings
+        IDs of events without results.
+
+    """
+
+    header, events = read_events(event_string)
+    expected = defaultdict(int)
+    for event in events:
+        expected[event[2]] += 1
+
+    output_header = None
+    results = defaultdict(list)
+    for output_file in output_files:
+        with open_event_file(output_file) as f:
+            for line in f:
+                if line.startswith('#'):
+                    if output_header is None:
+                        output_header = line
+                    continue
+                if not line.strip():
+                    continue
+                results[line.split('\t', 1)[0]].append(line)
+
+    unknown = [event_id for event_id in results if event_id not in expected]
+    duplicates = [event_id for event_id, lines in results.iteritems()
+                  if event_id in expected and len(lines) > expected[event_id]]
+    missing = [event[2] for event in events if not results.get(event[2])]
+
+    problems = []
+    if unknown:
+        problems.append("%d events not in %s (e.g. %s)" %
+                        (len(unknown), event_string, ', '.join(unknown[:5])))
+    if duplicates:
+        problems.append("%d events present more than once (e.g. %s)" %
+                        (len(duplicates), ', '.join(duplicates[:5])))
+    if missing and not allow_missing:
+        problems.append("%d events missing (e.g. %s)" %
+                        (len(missing), ', '.join(missing[:5])))
+    if problems:
+        raise BENTOSeqError("Cannot merge outputs: " + '; '.join(problems) + '.')
+
+    with open_file(merged_file, 'w') as f:
+        if output_header is not None:
+            f.write(output_header)
+        for event in events:
+            lines = results.get(event[2])
+            if lines:
+                line = lines.pop(0)
+                f.write(line if line.endswith('\n') else line + '\n')
+
+    if missing:
+        logging.warning("%d events without results." % len(missing))
+    logging.info("Merged %d output files into '%s'." %
+                 (len(output_files), merged_file))
+    return missing
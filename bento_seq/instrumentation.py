@@ -0,0 +1,143 @@
+import json
+import time
+import logging
+from collections import Counter
+from contextlib import contextmanager
+
+
+@contextmanager
+def _no_op():
+    yield
+
+
+def stage(stats, name):
+    """Return a context manager timing stage ``name`` in ``stats``,
+    or one that does nothing if ``stats`` is None."""
+
+    if stats is None:
+        return _no_op()
+    return stats.stage(name)
+
+
+class Instrumentation(object):
+    """Accumulates wall time per processing stage and read counters.
+
+    An instance can be passed to
+    :py:meth:`bento_seq.alt_splice_event.AltSpliceEvent.build_read_distribution`
+    and :py:meth:`bento_seq.read_distribution.ReadDistribution.from_junction`
+    to record where time is spent and why reads are skipped. When no
+    instance is passed, no timing overhead is incurred.
+
+    **Parameters:**
+
+    progress_interval : float (optional)
+        If given, log the progress (events/sec and reads/sec) at most
+        every ``progress_interval`` seconds.
+
+    n_events_total : int (optional)
+        Total number of events, used in the progress messages.
+
+    """
+
+    STAGES = ('parse', 'fetch', 'cigar', 'trim_reads', 'bootstrap', 'output')
+    SKIP_REASONS = ('no_junction', 'other_junction', 'antisense',
+                    'mate_counted', 'nh_filter', 'edit_distance',
+                    'indel_at_ss')
+
+    def __init__(self, progress_interval=None, n_events_total=None):
+        self.stage_times = dict.fromkeys(self.STAGES, 0.)
+        self.skipped = Counter()
+        self.n_events = 0
+        self.n_events_skipped = 0
+        self.n_reads_scanned = 0
+        self.n_reads_counted = 0
+        self.progress_interval = progress_interval
+        self.n_events_total = n_events_total
+        self._start_time = time.time()
+        self._last_progress = self._start_time
+
+    @contextmanager
+    def stage(self, name):
+        """Context manager that adds the elapsed wall time to stage
+        ``name``."""
+
+        t0 = time.time()
+        try:
+            yield
+        finally:
+            self.stage_times[name] += time.time() - t0
+
+    def timed_fetch(self, reads):
+        """Wrap an iterator over reads (*e.g.* from
+        :py:meth:`pysam.Samfile.fetch`) and add the time spent
+        retrieving reads to the ``'fetch'`` stage."""
+
+        reads = iter(reads)
+        while True:
+            t0 = time.time()
+            try:
+                read = next(reads)
+            except StopIteration:
+                self.stage_times['fetch'] += time.time() - t0
+                return
+            self.stage_times['fetch'] += time.time() - t0
+            self.n_reads_scanned += 1
+            yield read
+
+    def skip(self, reason):
+        """Count a read that was skipped for ``reason``."""
+        self.skipped[reason] += 1
+
+    def count_read(self):
+        self.n_reads_counted += 1
+
+    def event_done(self, skipped=False):
+        """Register a processed event and log the progress if
+        ``progress_interval`` has elapsed."""
+
+        self.n_events += 1
+        if skipped:
+            self.n_events_skipped += 1
+
+        if self.progress_interval is not None:
+            now = time.time()
+            if now - self._last_progress >= self.progress_interval:
+                self._last_progress = now
+                self.log_progress()
+
+    @property
+    def elapsed(self):
+        return time.time() - self._start_time
+
+    def log_progress(self):
+        elapsed = self.elapsed
+        if self.n_events_total:
+            done = "%d/%d events" % (self.n_events, self.n_events_total)
+        else:
+            done = "%d events" % self.n_events
+        logging.info("Processed %s (%.1f events/sec, %.1f reads/sec)." %
+                     (done, self.n_events / elapsed,
+                      self.n_reads_scanned / elapsed))
+
+    def report(self):
+        """Return all timings and counters as a dictionary."""
+
+        elapsed = self.elapsed
+        return {
+            'elapsed': elapsed,
+            'stage_times': dict(self.stage_times),
+            'n_events': self.n_events,
+            'n_events_skipped': self.n_events_skipped,
+            'n_reads_scanned': self.n_reads_scanned,
+            'n_reads_counted': self.n_reads_counted,
+            'reads_skipped': dict((reason, self.skipped[reason])
+                                  for reason in self.SKIP_REASONS),
+            'events_per_sec': self.n_events / elapsed if elapsed else None,
+            'reads_per_sec': self.n_reads_scanned / elapsed if elapsed else None
+        }
+
+    def write_json(self, filename):
+        """Write the report to ``filename`` in JSON format."""
+
+        with open(filename, 'w') as f:
+            json.dump(self.report(), f, indent=2, sort_keys=True)
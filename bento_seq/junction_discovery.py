@@ -0,0 +1,297 @@
+"""Genome-wide junction discovery.
+
+All spliced reads in the BAM-files are processed in a single pass and
+the read distribution of every junction they span is tallied, using
+the same filters as
+:py:meth:`bento_seq.read_distribution.ReadDistribution.from_junction`.
+The result is written as a junction table, sorted by chromosome (in
+the order of the BAM header), start, and end, in which every junction
+is marked as annotated if it is part of an event.
+
+The table is tab-separated with the columns ``chromosome``, ``start``,
+``end`` (0-based, right-open intron coordinates), ``strand`` (``.``
+for unstranded libraries), ``annotated``,
+``n_reads``, ``read_length``, and ``distribution``. The distribution
+is given sparsely as ``pos:count`` pairs separated by commas, where
+``pos`` is the position of the read relative to the junction. A
+``##parameters`` line before the header records the read filters used.
+
+A junction table can be used in place of the BAM-files when
+quantifying events (see :py:class:`JunctionTableCache`), so that a
+single pass over the BAM-files gives both the novel junctions and the
+PSI of the events.
+
+"""
+
+import logging
+
+from . import BENTOSeqError
+from .load_as_event_data import open_file
+from .read_distribution import ReadDistribution, MateLookup, \
+    has_junction, get_junctions, get_transcript_strand, parse_read
+
+TABLE_HEADER = ('#chromosome', 'start', 'end', 'strand', 'annotated',
+                'n_reads', 'read_length', 'distribution')
+TABLE_PARAMETERS = ('max_edit_distance', 'max_num_mapped_loci',
+                    'library_type', 'paired_end')
+
+
+def discover_chromosome(bamfiles, chromosome, max_edit_distance=2,
+                        max_num_mapped_loci=1, library_type='unstranded',
+                        paired_end=False, stats=None):
+    """Tally the read distributions of all junctions on
+    ``chromosome``.
+
+    **Returns:**
+
+    read_distributions : dict
+        Dictionary mapping ``(start, end, strand)`` to
+        :py:class:`bento_seq.read_distribution.ReadDistribution`.
+
+    """
+
+    read_distributions = {}
+    read_length = None
+    for bamfile in bamfiles:
+        mates = MateLookup() if paired_end else None
+        reads = bamfile.fetch(chromosome)
+        if stats is not None:
+            reads = stats.timed_fetch(reads)
+
+        for read in reads:
+            if not has_junction.search(read.cigarstring):
+                if stats is not None: stats.skip('no_junction')
+                continue
+
+            skip_reason, block_sizes = parse_read(
+                read, max_edit_distance, max_num_mapped_loci)
+            if skip_reason is not None:
+                if stats is not None: stats.skip(skip_reason)
+                continue
+
+            if read_length is None:
+                read_length = read.rlen
+
+            strand = get_transcript_strand(read, library_type) or '.'
+            for junction_idx, (start, end) in enumerate(get_junctions(read)):
+                key = (start, end, strand)
+
+                # Count a read pair only once per junction
+                if mates is not None:
+                    if mates.pop_mate(read, key):
+                        if stats is not None: stats.skip('mate_counted')
+                        continue
+                    mates.add(read, key)
+
+                try:
+                    read_distribution = read_distributions[key]
+                except KeyError:
+                    read_distribution = read_distributions[key] = \
+                        ReadDistribution(chromosome, start, end, read_length)
+                # Only counts are kept; references to the reads would
+                # hold the whole BAM-file in memory
+                rel_pos = -sum(block_sizes[:(junction_idx + 1)])
+                read_distribution[rel_pos] += 1
+            if stats is not None: stats.count_read()
+
+    return read_distributions
+
+
+def discover_junctions(bamfiles, output_file, annotated_junctions=None,
+                       max_edit_distance=2, max_num_mapped_loci=1,
+                       library_type='unstranded', paired_end=False,
+                       stats=None):
+    """Discover all junctions in ``bamfiles`` and write the junction
+    table to ``output_file``.
+
+    Chromosomes are processed one at a time, so memory is bounded by
+    the number of junctions on a single chromosome.
+
+    **Parameters:**
+
+    bamfiles : list of :py:class:`pysam.Samfile`
+
+    output_file : string
+        Output file name. Compressed with gzip if it ends in ``gz``.
+
+    annotated_junctions : set (optional)
+        Set of ``(chromosome, start, end, strand)`` of known junctions,
+        *e.g.* the ``junctions`` of all events with their strand.
+
+    max_edit_distance : int (default=2)
+
+    max_num_mapped_loci : int (default=1)
+
+    library_type : {'unstranded', 'fr-firststrand', 'fr-secondstrand'} (default='unstranded')
+        For stranded libraries, junctions are tallied separately per
+        strand.
+
+    paired_end : bool (default=False)
+        Count every read pair only once per junction.
+
+    stats : :class:`bento_seq.instrumentation.Instrumentation` (optional)
+
+    **Returns:**
+
+    n_junctions, n_novel : int
+        The number of junctions found and the number of those that
+        are not annotated.
+
+    """
+
+    if annotated_junctions is None:
+        annotated_junctions = set()
+
+    chromosomes = []
+    for bamfile in bamfiles:
+        for chromosome in bamfile.references:
+            if chromosome not in chromosomes:
+                chromosomes.append(chromosome)
+
+    n_junctions = n_novel = 0
+    parameters = (max_edit_distance, max_num_mapped_loci, library_type,
+                  int(bool(paired_end)))
+    with open_file(output_file, 'w') as f:
+        f.write('\t'.join(['##parameters'] +
+                          ['%s=%s' % item
+                           for item in zip(TABLE_PARAMETERS, parameters)]) +
+                '\n')
+        f.write('\t'.join(TABLE_HEADER) + '\n')
+        for chromosome in chromosomes:
+            read_distributions = discover_chromosome(
+                [bamfile for bamfile in bamfiles
+                 if chromosome in bamfile.references],
+                chromosome, max_edit_distance, max_num_mapped_loci,
+                library_type, paired_end, stats)
+
+            for (start, end, strand) in sorted(read_distributions):
+                read_distribution = read_distributions[(start, end, strand)]
+                counts = sorted(read_distribution.to_dict().items())
+                if strand == '.':
+                    annotated = any((chromosome, start, end, s) in annotated_junctions
+                                    for s in '+-')
+                else:
+                    annotated = (chromosome, start, end, strand) in annotated_junctions
+                f.write('%s\t%d\t%d\t%s\t%d\t%d\t%d\t%s\n' % (
+                    chromosome, start, end, strand, annotated,
+                    sum(count for pos, count in counts),
+                    read_distribution.read_length,
+                    ','.join('%d:%d' % item for item in counts)))
+                n_junctions += 1
+                n_novel += not annotated
+
+            logging.debug("Found %d junctions on %s." %
+                          (len(read_distributions), chromosome))
+
+    return n_junctions, n_novel
+
+
+def read_junction_table(filename):
+    """Read a junction table written by :py:func:`discover_junctions`.
+
+    **Returns:**
+
+    An iterator over ``(read_distribution, strand, annotated)``, where
+    ``read_distribution`` is a
+    :py:class:`bento_seq.read_distribution.ReadDistribution`.
+
+    """
+
+    with open_file(filename) as f:
+        for line in f:
+            if line.startswith('#'):
+                continue
+            chromosome, start, end, strand, annotated, n_reads, \
+                read_length, distribution = line.rstrip('\n').split('\t')
+            counts = dict(map(int, item.split(':'))
+                          for item in distribution.split(',') if item)
+            yield (ReadDistribution(chromosome, int(start), int(end),
+                                    int(read_length), counts),
+                   strand, bool(int(annotated)))
+
+
+def read_table_parameters(filename):
+    """Return the read filters a junction table was created with as a
+    tuple ``(max_edit_distance, max_num_mapped_loci, library_type,
+    paired_end)``, or ``None`` if they are not recorded."""
+
+    with open_file(filename) as f:
+        for line in f:
+            if not line.startswith('#'):
+                break
+            if line.startswith('##parameters'):
+                values = dict(item.split('=', 1) for item in
+                              line.rstrip('\n').split('\t')[1:])
+                return (int(values['max_edit_distance']),
+                        int(values['max_num_mapped_loci']),
+                        values['library_type'],
+                        bool(int(values['paired_end'])))
+    return None
+
+
+class JunctionTableCache(object):
+    """Read distributions from a junction table, to be used as the
+    ``junction_cache`` of
+    :py:meth:`bento_seq.alt_splice_event.AltSpliceEvent.build_read_distribution`.
+
+    Junctions that are not in the table have no reads, so events are
+    quantified without reading the BAM-files. Raises
+    :py:exc:`bento_seq.BENTOSeqError` if the read filters of a lookup
+    differ from those the table was created with.
+
+    **Parameters:**
+
+    filename : string
+        Junction table written by :py:func:`discover_junctions`.
+
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.parameters = read_table_parameters(filename)
+        if self.parameters is None:
+            logging.warning("Junction table '%s' does not record its read "
+                            "filters; they are not checked." % filename)
+
+        self.read_length = None
+        self._read_distributions = {}
+        for read_distribution, strand, annotated in \
+                read_junction_table(filename):
+            junction = (read_distribution.chromosome,
+                        read_distribution.start, read_distribution.end)
+            self._read_distributions[
+                (junction, None if strand == '.' else strand)] = \
+                read_distribution
+            if self.read_length is None:
+                self.read_length = read_distribution.read_length
+
+        if self.read_length is None:
+            raise BENTOSeqError("Junction table '%s' is empty." % filename)
+
+    def __len__(self):
+        return len(self._read_distributions)
+
+    def get(self, key):
+        """Return the read distribution for a key of the form ``(junction,
+        max_edit_distance, max_num_mapped_loci, library_type, strand,
+        paired_end)``."""
+
+        junction, max_edit_distance, max_num_mapped_loci, library_type, \
+            strand, paired_end = key
+        parameters = (max_edit_distance, max_num_mapped_loci, library_type,
+                      bool(paired_end))
+        if self.parameters is not None and parameters != self.parameters:
+            raise BENTOSeqError(
+                "Junction table '%s' was created with different read "
+                "filters: %s." % (self.filename, ', '.join(
+                    '%s=%s' % item
+                    for item in zip(TABLE_PARAMETERS, self.parameters))))
+
+        read_distribution = self._read_distributions.get((junction, strand))
+        if read_distribution is None:
+            read_distribution = ReadDistribution(
+                junction[0], junction[1], junction[2], self.read_length)
+        return read_distribution
+
+    def put(self, key, read_distribution):
+        pass
@@ -1,8 +1,11 @@
 import os
+import zlib
+import fcntl
 import shutil
 import gzip
-import urllib
+import hashlib
 from urlparse import urljoin
+from contextlib import contextmanager
 
 EVENTS_ROOT = 'http://www.psi.utoronto.ca/~hannes/bento-seq-events/'
 
@@ -13,6 +16,8 @@ AS_EVENTS = {
     'mm10': urljoin(EVENTS_ROOT, 'mm10.refseq.event_set.bento-seq.tab.gz')
 }
 
+CHUNK_SIZE = 2 ** 20
+
 DATA_HOME = os.path.abspath(
     os.path.expanduser(
         os.environ.get(
@@ -37,39 +42,182 @@ def clear_data_home():
     data_home = get_data_home()
     shutil.rmtree(data_home)
 
-def count_lines(filename, comment_char=None):
+def open_file(filename, mode='r'):
+    """Open ``filename``, with gzip if it ends in ``gz`` or
+    ``gzip``."""
+
     if filename.endswith('gz') or filename.endswith('gzip'):
-        f = gzip.open(filename)
-    else:
-        f = open(filename)
+        return gzip.open(filename, mode if 'b' in mode else mode + 'b')
+    return open(filename, mode)
 
-    if comment_char is None:
-        lines = sum(1 for _ in f)
-    else:
+def count_lines(filename, comment_char=None):
+    with open_file(filename) as f:
+        if comment_char is None:
+            return sum(1 for _ in f)
         return sum(1 for line in f if not line.startswith(comment_char))
 
-    return lines
+def _md5sum(filename, chunk_size=CHUNK_SIZE):
+    md5 = hashlib.md5()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), ''):
+            md5.update(chunk)
+    return md5.hexdigest()
 
-def fetch(genome):
-    if not os.path.isdir(get_data_home()):
-        os.makedirs(get_data_home())
 
+def _verify_gzip(filename, chunk_size=CHUNK_SIZE):
+    """Decompress the whole file to check its integrity."""
     try:
-        url = AS_EVENTS[genome]
-    except NameError:
-        raise NameError("Unknown genome: %s" % genome)
+        with gzip.open(filename, 'rb') as f:
+            while f.read(chunk_size):
+                pass
+    except (IOError, EOFError, zlib.error) as e:
+        raise IOError("Corrupted file %s: %s" % (filename, e))
+
+
+def _fetch_md5(url):
+    """Return the checksum published in ``url + '.md5'`` or ``None``
+    if there is none."""
+    import urllib2
+
+    try:
+        response = urllib2.urlopen(url + '.md5')
+        try:
+            return response.read().split()[0].lower()
+        finally:
+            response.close()
+    except (urllib2.URLError, IndexError):
+        return None
+
+
+@contextmanager
+def _lock(filename):
+    """Exclusive lock on ``filename`` that is held while the block is
+    executed. Blocks until the lock is acquired."""
+
+    with open(filename, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _expected_size(response, offset):
+    """Total size of the file from the ``Content-Range`` or
+    ``Content-Length`` header of ``response``, or ``None`` if
+    unknown."""
+
+    content_range = response.info().getheader('Content-Range')
+    if content_range and '/' in content_range:
+        total = content_range.rsplit('/', 1)[1].strip()
+        if total.isdigit():
+            return int(total)
+    content_length = response.info().getheader('Content-Length')
+    if content_length and content_length.strip().isdigit():
+        return offset + int(content_length)
+    return None
+
+
+def download(url, dest, md5=None, chunk_size=CHUNK_SIZE):
+    """Download ``url`` to ``dest``.
+
+    The data is streamed to ``dest + '.part'``, which is renamed to
+    ``dest`` only once the download is complete and verified. If a
+    partial download exists, the download is resumed with an HTTP
+    range request. If the server does not support range requests, the
+    download starts over. If the connection is closed before the
+    complete file is received, the partial download is kept and an
+    :py:exc:`IOError` is raised, so that the next call resumes it.
+
+    **Parameters:**
+
+    url : string
+
+    dest : string
+
+    md5 : string (optional)
+        Expected MD5 checksum of the file. If given and the checksum
+        of the download does not match, the partial download is deleted
+        and an :py:exc:`IOError` is raised.
+
+    chunk_size : int (default=1MB)
+
+    """
+    import urllib2
+
+    part = dest + '.part'
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+
+    request = urllib2.Request(url)
+    if offset:
+        request.add_header('Range', 'bytes=%d-' % offset)
+
+    try:
+        response = urllib2.urlopen(request)
+    except urllib2.HTTPError as e:
+        if e.code != 416 or not offset:
+            raise
+        # Requested range not satisfiable: the partial file is complete
+        response = None
+
+    if response is not None:
+        try:
+            if offset and response.getcode() != 206:
+                # Server ignored the range request
+                offset = 0
+            size = _expected_size(response, offset)
+            with open(part, 'ab' if offset else 'wb') as f:
+                for chunk in iter(lambda: response.read(chunk_size), ''):
+                    f.write(chunk)
+        finally:
+            response.close()
+
+        # A connection closed early ends the download without an
+        # error; keep the partial file to resume from
+        if size is not None and os.path.getsize(part) < size:
+            raise IOError("Incomplete download of %s: received %d of %d "
+                          "bytes." % (url, os.path.getsize(part), size))
 
-    dest = os.path.join(get_data_home(), os.path.basename(url))
     try:
-        gzip.open(dest, 'rb').close()
+        if md5 is not None and _md5sum(part) != md5.lower():
+            raise IOError("Checksum mismatch for %s." % url)
+        if dest.endswith('gz'):
+            _verify_gzip(part)
     except IOError:
-        print "Downloading %s from %s." % (genome, url)
-        downloader = urllib.urlopen(url)
-        data = downloader.read()
-        tmp = open(dest, 'wb')
-        tmp.write(data)
-        tmp.close()
-        gzip.open(dest, 'rb').close()
+        os.remove(part)
+        raise
+
+    os.rename(part, dest)
+    return dest
+
+
+def fetch(genome):
+    if not os.path.isdir(get_data_home()):
+        os.makedirs(get_data_home())
+
+    url = AS_EVENTS[genome]
+    dest = os.path.join(get_data_home(), os.path.basename(url))
+
+    # A marker records that dest was verified, so it is only verified
+    # once. Files from older versions, which were not downloaded
+    # atomically, are verified before they are used.
+    verified = dest + '.verified'
+    if os.path.exists(dest) and os.path.exists(verified):
+        return dest
+
+    # Only one process downloads, others wait and then use the file
+    with _lock(dest + '.lock'):
+        if os.path.exists(dest) and not os.path.exists(verified) and \
+           dest.endswith('gz'):
+            try:
+                _verify_gzip(dest)
+            except IOError as e:
+                print "%s Downloading again." % e
+                os.remove(dest)
+        if not os.path.exists(dest):
+            print "Downloading %s from %s." % (genome, url)
+            download(url, dest, _fetch_md5(url))
+        open(verified, 'w').close()
 
     return dest
 
@@ -77,9 +225,23 @@ def open_event_file(event_string):
     if event_string in AS_EVENTS:
         event_string = fetch(event_string)
 
-    if event_string.endswith('gz') or event_string.endswith('gzip'):
-        f = gzip.open(event_string, 'rb')
+    return open_file(event_string, 'rb')
+
+def parse_event_line(line):
+    """Split a line of an event definitions file into the arguments of
+    :py:class:`bento_seq.alt_splice_event.AltSpliceEvent`.
+
+    **Returns:**
+
+    event_type, event_id, chromosome, strand, exons
+
+    """
+
+    elements = line.rstrip('\r\n').split('\t')
+    event_type, event_id, chromosome, strand = elements[:4]
+    if event_type.upper() != 'MXE':
+        exons = [tuple(map(int, e.split(':'))) for e in elements[4:7]]
     else:
-        f = open(event_string, 'rb')
+        exons = [tuple(map(int, e.split(':'))) for e in elements[4:8]]
 
-    return f
\ No newline at end of file
+    return event_type, event_id, chromosome, strand, exons
@@ -0,0 +1,18 @@
+"""Default counting and bootstrap parameters shared by the server and
+the concurrent quantification API. They are the defaults of the
+``bento-seq`` command line, so that all entry points give the same
+PSI; note that ``r`` differs from the default of
+:py:meth:`bento_seq.alt_splice_event.AltSpliceEvent.bootstrap_event`."""
+
+DEFAULT_OPTIONS = {
+    'min_overhang': 5,
+    'max_edit_distance': 2,
+    'max_num_mapped_loci': 1,
+    'library_type': 'unstranded',
+    'paired_end': False,
+    'n_bootstrap_samples': 1000,
+    'n_grid_points': 100,
+    'a': 1,
+    'b': 1,
+    'r': 1
+}
@@ -0,0 +1,220 @@
+"""Concurrent quantification of alternative splicing events.
+
+Reading from the BAM-files and bootstrapping are overlapped: read
+distributions are built in a pool of threads, each with its own
+BAM-file handles, while the bootstrap runs in a pool of worker
+processes. The number of events in flight is bounded, and results are
+returned in the order in which they complete.
+
+"""
+
+import sys
+import threading
+import Queue
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
+
+from .options import DEFAULT_OPTIONS
+
+# Interval in seconds at which a waiting consumer checks that the
+# worker processes are alive
+POLL_INTERVAL = 1.
+
+_thread_state = threading.local()
+
+
+def _open_bamfiles(bam_files):
+    import pysam
+    _thread_state.bamfiles = [pysam.Samfile(bamfile, check_header=False)
+                              for bamfile in bam_files]
+
+
+def _build_read_distribution(event, options):
+    try:
+        event.build_read_distribution(
+            _thread_state.bamfiles, options['min_overhang'],
+            options['max_edit_distance'], options['max_num_mapped_loci'],
+            options['library_type'], options['paired_end'])
+    except Exception as e:
+        return False, e
+    return True, event
+
+
+def _bootstrap(event, options):
+    try:
+        result = event.bootstrap_event(
+            options['n_bootstrap_samples'], options['n_grid_points'],
+            options['a'], options['b'], options['r'])
+    except Exception as e:
+        return False, e
+    return True, result
+
+
+class _SubmitDone(object):
+    """Marks the end of the submitted events in the results queue."""
+
+    def __init__(self, exc_info):
+        self.exc_info = exc_info
+
+
+class EventQuantifier(object):
+    """Quantify events concurrently.
+
+    **Parameters:**
+
+    bam_files : list of strings
+        Paths of the BAM-files. Every I/O thread opens its own handles.
+
+    n_io_threads : int (default=4)
+        Number of threads reading from the BAM-files.
+
+    n_cpu_workers : int (optional)
+        Number of processes running the bootstrap. Defaults to the
+        number of CPUs.
+
+    max_in_flight : int (default=32)
+        Maximum number of events that are being processed at the same
+        time. Bounds the memory held by read distributions waiting for
+        the bootstrap.
+
+    options : dict (optional)
+        Counting and bootstrap parameters, see
+        :py:data:`bento_seq.options.DEFAULT_OPTIONS`.
+
+    **Example:**
+
+    ::
+
+        with EventQuantifier(['sample.bam']) as quantifier:
+            for event_id, result in quantifier.imap_unordered(events):
+                if isinstance(result, Exception):
+                    continue
+                n_inc, n_exc, p_inc, p_exc, psi, psi_bootstrap, psi_std = result
+
+    """
+
+    def __init__(self, bam_files, n_io_threads=4, n_cpu_workers=None,
+                 max_in_flight=32, options=None):
+        self.options = dict(DEFAULT_OPTIONS)
+        if options:
+            self.options.update(options)
+        self.max_in_flight = max_in_flight
+        self._io_pool = ThreadPool(n_io_threads, _open_bamfiles, (bam_files,))
+        self._cpu_pool = Pool(n_cpu_workers)
+        self._worker_pids = self._current_worker_pids()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._io_pool.terminate()
+        self._cpu_pool.terminate()
+        self._io_pool.join()
+        self._cpu_pool.join()
+
+    def _current_worker_pids(self):
+        return set(process.pid for process in self._cpu_pool._pool
+                   if process.exitcode is None)
+
+    def _check_workers(self):
+        """Raise :py:exc:`RuntimeError` if a worker process died.
+
+        :py:class:`multiprocessing.Pool` silently replaces dead
+        workers, but the task a worker was running is lost and its
+        callback is never called."""
+
+        if self._current_worker_pids() != self._worker_pids:
+            raise RuntimeError("A bootstrap worker process died; the "
+                               "events it was processing are lost.")
+
+    def imap_unordered(self, events):
+        """Quantify ``events`` and yield ``(event_id, result)`` in
+        completion order.
+
+        **Parameters:**
+
+        events : iterable of :py:class:`bento_seq.alt_splice_event.AltSpliceEvent`
+            Events are consumed lazily, at most ``max_in_flight`` at a
+            time.
+
+        **Returns:**
+
+        An iterator over ``(event_id, result)``, where ``result`` is
+        the return value of
+        :py:meth:`bento_seq.alt_splice_event.AltSpliceEvent.bootstrap_event`
+        or the exception raised while processing the event. An
+        exception raised by ``events`` is re-raised after the events
+        submitted before it are returned. If a worker process dies,
+        :py:exc:`RuntimeError` is raised.
+
+        """
+
+        results = Queue.Queue()
+        in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        options = self.options
+
+        def finish(event_id, result):
+            results.put((event_id, result))
+            in_flight.release()
+
+        def on_bootstrap(event_id):
+            def callback(r):
+                finish(event_id, r[1])
+            return callback
+
+        def on_read_distribution(event_id):
+            def callback(r):
+                ok, value = r
+                if not ok:
+                    finish(event_id, value)
+                    return
+                try:
+                    self._cpu_pool.apply_async(
+                        _bootstrap, (value, options),
+                        callback=on_bootstrap(event_id))
+                except Exception as e:
+                    finish(event_id, e)
+            return callback
+
+        submitted = [0]
+
+        def submit():
+            exc_info = None
+            try:
+                for event in events:
+                    in_flight.acquire()
+                    submitted[0] += 1
+                    self._io_pool.apply_async(
+                        _build_read_distribution, (event, options),
+                        callback=on_read_distribution(event.event_id))
+            except Exception:
+                exc_info = sys.exc_info()
+            finally:
+                # Wakes up the consumer in case no event is in flight
+                # and passes on the exception raised by events, if any
+                results.put(_SubmitDone(exc_info))
+
+        submitter = threading.Thread(target=submit)
+        submitter.daemon = True
+        submitter.start()
+
+        n_done = 0
+        submit_done = None
+        while submit_done is None or n_done < submitted[0]:
+            try:
+                item = results.get(timeout=POLL_INTERVAL)
+            except Queue.Empty:
+                self._check_workers()
+                continue
+            if isinstance(item, _SubmitDone):
+                submit_done = item
+                continue
+            n_done += 1
+            yield item
+
+        exc_info = submit_done.exc_info
+        if exc_info is not None:
+            raise exc_info[0], exc_info[1], exc_info[2]
@@ -0,0 +1,101 @@
+import os
+import re
+import heapq
+import logging
+import cProfile
+
+import numpy as np
+
+
+class EventProfiler(object):
+    """Keeps track of the most expensive events.
+
+    Records the elapsed time, the number of reads scanned, and the
+    number of reads counted for every event and keeps the ``top_k``
+    slowest events. Optionally, events slower than
+    ``profile_threshold`` are run again under :py:mod:`cProfile`, so
+    that all other events run, and are timed, without the overhead of
+    the profiler. The state of the NumPy random number generator is
+    restored after profiling, so the results of the following events
+    do not depend on whether events were profiled.
+
+    **Parameters:**
+
+    top_k : int (default=20)
+        Number of slowest events to keep.
+
+    profile_threshold : float (optional)
+        Events taking longer than this many seconds are profiled.
+
+    profile_dir : string (optional)
+        Directory where the profiles are written, one file per event
+        in the :py:mod:`pstats` format. Required when
+        ``profile_threshold`` is given.
+
+    """
+
+    def __init__(self, top_k=20, profile_threshold=None, profile_dir=None):
+        if profile_threshold is not None and profile_dir is None:
+            raise ValueError("profile_dir is required with profile_threshold.")
+
+        self.top_k = top_k
+        self.profile_threshold = profile_threshold
+        self.profile_dir = profile_dir
+        self.n_profiled = 0
+        self._heap = []
+
+        if profile_dir is not None and not os.path.isdir(profile_dir):
+            os.makedirs(profile_dir)
+
+    def record(self, event_id, elapsed, reads_scanned, reads_counted):
+        """Record the cost of an event."""
+
+        item = (elapsed, event_id, reads_scanned, reads_counted)
+        if len(self._heap) < self.top_k:
+            heapq.heappush(self._heap, item)
+        elif elapsed > self._heap[0][0]:
+            heapq.heapreplace(self._heap, item)
+
+    def should_profile(self, elapsed):
+        return self.profile_threshold is not None and \
+            elapsed > self.profile_threshold
+
+    def profile(self, event_id, func, *args, **kwargs):
+        """Run ``func(*args, **kwargs)`` again under :py:mod:`cProfile`
+        and write the profile of ``event_id`` to ``profile_dir``. The
+        state of the NumPy random number generator is restored
+        afterwards."""
+
+        random_state = np.random.get_state()
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(func, *args, **kwargs)
+        finally:
+            np.random.set_state(random_state)
+            filename = os.path.join(
+                self.profile_dir,
+                re.sub(r'[^\w.-]', '_', str(event_id)) + '.prof')
+            profiler.dump_stats(filename)
+            self.n_profiled += 1
+            logging.debug("Profile of event %s written to '%s'." %
+                          (event_id, filename))
+
+    @property
+    def slowest(self):
+        """The slowest events as a list of ``(event_id, elapsed,
+        reads_scanned, reads_counted)``, slowest first."""
+
+        return [(event_id, elapsed, reads_scanned, reads_counted)
+                for elapsed, event_id, reads_scanned, reads_counted
+                in sorted(self._heap, reverse=True)]
+
+    def write(self, filename):
+        """Write the slowest events to ``filename`` as a tab-separated
+        table."""
+
+        with open(filename, 'w') as f:
+            f.write('\t'.join(('#ID', 'elapsed', 'reads_scanned',
+                               'reads_counted')) + '\n')
+            for event_id, elapsed, reads_scanned, reads_counted in self.slowest:
+                f.write('%s\t%.6f\t%d\t%d\n' %
+                        (event_id, elapsed, reads_scanned, reads_counted))
@@ -1,6 +1,9 @@
 import re
+import time
+import heapq
+import logging
 from copy import copy
-from collections import Counter
+from collections import Counter, OrderedDict
 
 has_junction = re.compile(r'(\d+)N')                # Read has junction
 soft_clipping_left = re.compile(r'^(\d+)S(\d+)M')   # Read has soft-clipping on left side
@@ -13,6 +16,175 @@ merge_cigar = re.compile(r'(\d+)M(\d+)M')           # Merge consecutive matches
 find_junctions = re.compile(r'(\d+)M(\d+)N')        # Find splice junctions
 last_match = re.compile(r'(\d+)M$')                 # Find last aligned segment
 
+LIBRARY_TYPES = ('unstranded', 'fr-firststrand', 'fr-secondstrand')
+
+BAM_CMATCH = 0
+BAM_CDEL = 2
+BAM_CREF_SKIP = 3
+BAM_CEQUAL = 7
+BAM_CDIFF = 8
+
+def get_junctions(read):
+    """Return the splice junctions of a read.
+
+    **Returns:**
+
+    junctions : list
+        List of ``(start, end)`` of the skipped regions (``N``
+        operations in the CIGAR string) in 0-based coordinates, in
+        the order of the alignment.
+
+    """
+
+    junctions = []
+    pos = read.pos
+    for op, length in read.cigar:
+        if op == BAM_CREF_SKIP:
+            junctions.append((pos, pos + length))
+        if op in (BAM_CMATCH, BAM_CDEL, BAM_CREF_SKIP, BAM_CEQUAL, BAM_CDIFF):
+            pos += length
+    return junctions
+
+def get_transcript_strand(read, library_type):
+    """Return the strand of the transcript a read originates from.
+
+    **Parameters:**
+
+    read : :py:class:`pysam.AlignedRead`
+
+    library_type : {'unstranded', 'fr-firststrand', 'fr-secondstrand'}
+        For 'fr-firststrand' libraries (*e.g.* dUTP), the first read
+        (or the only read of single-end data) maps to the antisense
+        strand; for 'fr-secondstrand' libraries, it maps to the sense
+        strand.
+
+    **Returns:**
+
+    strand : {'+', '-', None}
+        ``None`` if the library is unstranded.
+
+    """
+
+    if library_type == 'unstranded':
+        return None
+
+    reverse = read.is_reverse
+    if read.is_read2:
+        reverse = not reverse
+    if library_type == 'fr-firststrand':
+        reverse = not reverse
+    elif library_type != 'fr-secondstrand':
+        raise ValueError("Unknown library type: %s" % library_type)
+
+    return '-' if reverse else '+'
+
+def parse_read(read, max_edit_distance=2, max_num_mapped_loci=1):
+    """Apply the read filters and compute the aligned block sizes of a
+    spliced read.
+
+    Soft-clipped bases are counted towards the edit distance and
+    towards the adjacent block; insertions and deletions are merged
+    into the adjacent blocks.
+
+    **Returns:**
+
+    skip_reason : string or None
+        ``'nh_filter'``, ``'edit_distance'``, or ``'indel_at_ss'`` if
+        the read should not be counted, otherwise ``None``.
+
+    block_sizes : list of ints
+        Sizes of the aligned blocks between the splice junctions, so
+        that the position of the read relative to junction ``i`` is
+        ``-sum(block_sizes[:i + 1])``. ``None`` if the read is
+        skipped.
+
+    """
+
+    pos = read.pos
+
+    # Extract [nN]M tag
+    tags = {key: value for key, value in read.tags}
+    if 'NM' in tags:
+        mapper = 'TopHat'
+        edit_distance = tags['NM']
+    elif 'nM' in tags:
+        mapper = 'STAR'
+        edit_distance = tags['nM']
+    else:
+        raise ValueError("Incompatible BAM/SAM format: "
+                         "optional TAG [Nn]M is not present.")
+
+    # Skip if the number of loci the read maps to is greater than allowed
+    if tags['NH'] > max_num_mapped_loci:
+        return 'nh_filter', None
+
+    cigar = copy(read.cigarstring)
+
+    # Count soft clipping towards the edit distance
+    m = soft_clipping_left.search(cigar)
+    if m:
+        edit_distance += int(m.groups()[0])
+        tmp = sum(map(int, m.groups()))
+        cigar = soft_clipping_left.sub('%dM' % tmp, cigar)
+        pos -= int(m.groups()[0])
+
+    m = soft_clipping_right.search(cigar)
+    if m:
+        edit_distance += int(m.groups()[1])
+        tmp = sum(map(int, m.groups()))
+        cigar = soft_clipping_right.sub('%dM' % tmp, cigar)
+
+    # Count indels for STAR input
+    if mapper == 'STAR':
+        for m in indel.finditer(cigar):
+            edit_distance += int(m.groups()[0])
+
+    # Skip if edit distance greater than allowed
+    if edit_distance > max_edit_distance:
+        return 'edit_distance', None
+
+    # Skip if there are indels right at the splice junction
+    if indel_at_ss_left.search(cigar) or indel_at_ss_right.search(cigar):
+        return 'indel_at_ss', None
+
+    # Pre-process indels to properly find read positions relative to junctions
+    if indel.search(cigar):
+        m = indel_right.search(cigar)
+        while m:
+            indel_type = m.groups()[2]
+
+            if indel_type == 'I':
+                tmp = int(m.groups()[0])
+            elif indel_type == 'D':
+                tmp = sum(map(int, m.groups()[:2]))
+            else:
+                raise ValueError
+            cigar = indel_right.sub('%dM' % tmp, cigar)
+            m = indel_right.search(cigar)
+
+        m = merge_cigar.search(cigar)
+        while m:
+            tmp = sum(map(int, m.groups()))
+            cigar = merge_cigar.sub('%dM' % tmp, cigar)
+            m = merge_cigar.search(cigar)
+
+    assert not merge_cigar.search(cigar)
+
+    blocks = [pos]
+    for m in find_junctions.finditer(cigar):
+        len_match = int(m.groups()[0])
+        len_junction = int(m.groups()[1])
+        end_prev = blocks[-1] + len_match      # End of the preceding aligned segment
+        start_next = end_prev + len_junction   # Start of next aligned segment
+        blocks += [end_prev, start_next]
+
+    m = last_match.search(cigar)
+    blocks += [blocks[-1] + int(m.groups()[0])]
+
+    block_sizes = [end - start for start, end in zip(blocks[::2], blocks[1::2])]
+    return None, block_sizes
+
+
 class ReadDistribution(object):
     """This class represents a distribution of reads across a splice junction.
 
@@ -75,6 +247,14 @@ class ReadDistribution(object):
     
         return [(pos, self._counter[pos]) for pos in self.get_positions(min_overhang)]
 
+    def to_dict(self):
+        """Return the read distribution as a dictionary in the format
+        ``{pos1: counts1, pos2: counts2, ...}``, including only
+        positions with reads."""
+
+        return dict((pos, count) for pos, count in self._counter.iteritems()
+                    if count)
+
     def __getitem__(self, pos):
         """Return the number of reads at ``pos``.
         """
@@ -114,7 +294,8 @@ class ReadDistribution(object):
     @classmethod
     def from_junction(cls, bamfiles, junction,
                       max_edit_distance=2,
-                      max_num_mapped_loci=1):
+                      max_num_mapped_loci=1, library_type='unstranded',
+                      strand=None, paired_end=False, stats=None):
         """Build the read distribution from a BAM-file.
 
         **Parameters:**
@@ -128,6 +309,21 @@ class ReadDistribution(object):
 
         max_num_mapped_loci : int (default=1)
 
+        library_type : {'unstranded', 'fr-firststrand', 'fr-secondstrand'} (default='unstranded')
+
+        strand : {'+', '-'} (optional)
+            Strand of the junction. For stranded libraries, only reads
+            originating from this strand are counted. Ignored for
+            unstranded libraries.
+
+        paired_end : bool (default=False)
+            Count every read pair only once, even if both mates span
+            the junction.
+
+        stats : :class:`bento_seq.instrumentation.Instrumentation` (optional)
+            If given, record the time spent fetching and processing
+            reads and count skipped reads by reason.
+
         **Returns:**
 
         read_distribution : :class:`bs_psi.read_distribution.ReadDistribution`    
@@ -141,102 +337,182 @@ class ReadDistribution(object):
         read_length = bamfiles[0].next().rlen
         read_distribution = cls(chromosome, junction_start, junction_end, read_length)
 
+        if library_type not in LIBRARY_TYPES:
+            raise ValueError("Unknown library type: %s" % library_type)
+        stranded = library_type != 'unstranded' and strand is not None
+
         for bamfile in bamfiles:
-            for read in bamfile.fetch(chromosome, junction_start, junction_start + 1):
+            mates = MateLookup() if paired_end else None
+            reads = bamfile.fetch(chromosome, junction_start, junction_start + 1)
+            if stats is not None:
+                t_start = time.time()
+                t_fetch = stats.stage_times['fetch']
+                reads = stats.timed_fetch(reads)
+
+            for read in reads:
                 # Skip reads without junctions
-                if not has_junction.search(read.cigarstring): continue
-
-                read_junctions = [(read.blocks[i][1], read.blocks[i + 1][0])
-                                  for i in range(len(read.blocks) - 1)]
-
-                if (junction_start, junction_end) not in read_junctions: continue
-
-                pos = read.pos
-
-                # Extract [nN]M tag
-                tags = {key: value for key, value in read.tags}
-                if 'NM' in tags:
-                    mapper = 'TopHat'
-                    edit_distance = tags['NM']
-                elif 'nM' in tags:
-                    mapper = 'STAR'
-                    edit_distance = tags['nM']
-                else:
-                    raise ValueError("Incompatible BAM/SAM format: "
-                                     "optional TAG [Nn]M is not present.")
-
-                # Skip if the number of loci the read maps to is greater than allowed
-                if tags['NH'] > max_num_mapped_loci: continue
-
-                cigar = copy(read.cigarstring)
-
-                # Count soft clipping towards the edit distance
-                m = soft_clipping_left.search(cigar)
-                if m:
-                    edit_distance += int(m.groups()[0])
-                    tmp = sum(map(int, m.groups()))
-                    cigar = soft_clipping_left.sub('%dM' % tmp, cigar)
-                    pos -= int(m.groups()[0])
-
-                m = soft_clipping_right.search(cigar)
-                if m:
-                    edit_distance += int(m.groups()[1])
-                    tmp = sum(map(int, m.groups()))
-                    cigar = soft_clipping_right.sub('%dM' % tmp, cigar)
-
-                # Count indels for STAR input
-                if mapper == 'STAR':
-                    for m in indel.finditer(cigar):
-                        edit_distance += int(m.groups()[0])
-
-                # Skip if edit distance greater than allowed
-                if edit_distance > max_edit_distance: continue
-
-                # Skip if there are indels right at the splice junction
-                if indel_at_ss_left.search(cigar) or indel_at_ss_right.search(cigar):
+                if not has_junction.search(read.cigarstring):
+                    if stats is not None: stats.skip('no_junction')
+                    continue
+
+                read_junctions = get_junctions(read)
+
+                if (junction_start, junction_end) not in read_junctions:
+                    if stats is not None: stats.skip('other_junction')
+                    continue
+
+                if stranded and get_transcript_strand(read, library_type) != strand:
+                    if stats is not None: stats.skip('antisense')
+                    continue
+
+                if mates is not None and mates.pop_mate(read):
+                    if stats is not None: stats.skip('mate_counted')
+                    continue
+
+                skip_reason, block_sizes = parse_read(
+                    read, max_edit_distance, max_num_mapped_loci)
+                if skip_reason is not None:
+                    if stats is not None: stats.skip(skip_reason)
                     continue
 
-                # Pre-process indels to properly find read positions relative to junctions
-                if indel.search(cigar):
-                    m = indel_right.search(cigar)
-                    while m:
-                        indel_type = m.groups()[2]
-
-                        if indel_type == 'I':
-                            tmp = int(m.groups()[0])
-                        elif indel_type == 'D':
-                            tmp = sum(map(int, m.groups()[:2]))
-                        else:
-                            raise ValueError
-                        cigar = indel_right.sub('%dM' % tmp, cigar)
-                        m = indel_right.search(cigar)
-
-                    m = merge_cigar.search(cigar)
-                    while m:
-                        tmp = sum(map(int, m.groups()))
-                        cigar = merge_cigar.sub('%dM' % tmp, cigar)
-                        m = merge_cigar.search(cigar)
-
-                assert not merge_cigar.search(cigar)
-
-                strand = '-' if read.is_reverse else '+'
-                blocks = [pos]
-                n_junc = 0
-                for m in find_junctions.finditer(cigar):
-                    n_junc += 1
-                    len_match = int(m.groups()[0])
-                    len_junction = int(m.groups()[1])
-                    end_prev = blocks[-1] + len_match      # End of the preceding aligned segment
-                    start_next = end_prev + len_junction   # Start of next aligned segment
-                    blocks += [end_prev, start_next]
-
-                m = last_match.search(cigar)
-                blocks += [blocks[-1] + int(m.groups()[0])]
-
-                block_sizes = [end - start for start, end in zip(blocks[::2], blocks[1::2])]
+                if mates is not None: mates.add(read)
+
                 junction_idx = read_junctions.index((junction_start, junction_end))
                 rel_pos = -sum(block_sizes[:(junction_idx + 1)])
 
                 read_distribution.inc(rel_pos, read)
+                if stats is not None: stats.count_read()
+
+            if stats is not None:
+                # Time spent inside the loop that was not spent fetching
+                stats.stage_times['cigar'] += \
+                    time.time() - t_start - (stats.stage_times['fetch'] - t_fetch)
+
+        return read_distribution
+
+
+class MateLookup(object):
+    """Bounded lookup of counted reads whose mates are still to come.
+
+    Reads must be added in the order of their mapping position, as
+    returned by :py:meth:`pysam.Samfile.fetch`. A counted read is only
+    remembered if its mate maps to the same chromosome at the same or
+    a later position, and it is forgotten as soon as the mate is found
+    or the fetch has moved past the position of the mate. Reads are
+    keyed by the hash of their query name and an optional extra key,
+    *e.g.* the junction.
+
+    **Parameters:**
+
+    max_size : int (default=100000)
+        Maximum number of reads to remember. If the lookup is full, the
+        read with the smallest mate position is forgotten, so its mate
+        may be counted as well.
+
+    """
+
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self._pending = {}
+        self._heap = []
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _expire(self, pos):
+        """Forget all reads whose mates map before ``pos``."""
 
+        heap = self._heap
+        while heap and heap[0][0] < pos:
+            mate_pos, key = heapq.heappop(heap)
+            if self._pending.get(key) == mate_pos:
+                del self._pending[key]
+
+    @staticmethod
+    def _has_mate(read):
+        return read.is_paired and not read.mate_is_unmapped and \
+            read.mrnm == read.tid
+
+    def pop_mate(self, read, extra_key=None):
+        """Return whether the mate of ``read`` was counted, and forget
+        the mate."""
+
+        self._expire(read.pos)
+        if not self._has_mate(read):
+            return False
+        return self._pending.pop((hash(read.qname), extra_key), None) is not None
+
+    def add(self, read, extra_key=None):
+        """Remember that ``read`` was counted."""
+
+        if not self._has_mate(read) or read.mpos < read.pos:
+            return
+
+        key = (hash(read.qname), extra_key)
+        self._pending[key] = read.mpos
+        heapq.heappush(self._heap, (read.mpos, key))
+
+        while len(self._pending) > self.max_size:
+            mate_pos, key = heapq.heappop(self._heap)
+            if self._pending.get(key) == mate_pos:
+                del self._pending[key]
+                logging.debug("Mate lookup full: mate at position %d may "
+                              "be counted twice." % mate_pos)
+
+        # Drop stale entries so the heap does not grow unboundedly
+        if len(self._heap) > 2 * self.max_size:
+            self._heap = [(mate_pos, key) for key, mate_pos
+                          in self._pending.iteritems()]
+            heapq.heapify(self._heap)
+
+
+class JunctionCache(object):
+    """Least-recently-used cache of read distributions.
+
+    Events frequently share junctions (*e.g.* overlapping exon
+    triplets), so caching the read distributions avoids fetching and
+    processing the same reads again.
+
+    **Parameters:**
+
+    max_size : int (default=10000)
+        Maximum number of read distributions to keep.
+
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def get(self, key):
+        """Return the cached read distribution for ``key`` or
+        ``None``."""
+
+        try:
+            read_distribution = self._cache.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self._cache[key] = read_distribution
+        self.hits += 1
         return read_distribution
+
+    def put(self, key, read_distribution):
+        """Cache a counts-only copy of ``read_distribution``, so that
+        the cache does not keep references to the counted reads."""
+
+        self._cache.pop(key, None)
+        self._cache[key] = ReadDistribution(
+            read_distribution.chromosome, read_distribution.start,
+            read_distribution.end, read_distribution.read_length,
+            read_distribution.to_dict())
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    def clear(self):
+        self._cache.clear()
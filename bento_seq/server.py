@@ -0,0 +1,252 @@
+"""A long-running PSI quantification server.
+
+The server keeps the BAM-files open and the junction read
+distributions cached in a pool of worker processes, so that
+quantifying a few events does not pay for interpreter start-up,
+imports, and opening the BAM-files and their indices.
+
+Requests are made over HTTP on localhost. ``POST /quantify`` expects a
+JSON object with the key ``events`` holding a list of event
+definitions, either as lines in the event file format or as objects
+with the keys ``event_type``, ``event_id``, ``chromosome``,
+``strand``, and ``exons``. The optional key ``one_based_pos``
+(default ``true``) selects the coordinate convention and ``options``
+may override the counting and bootstrap parameters of the server.
+``GET /stats`` reports the request latency percentiles.
+
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+import BaseHTTPServer
+import SocketServer
+from collections import deque
+from multiprocessing import Pool
+
+import numpy as np
+
+from . import BENTOSeqError
+from .alt_splice_event import AltSpliceEvent
+from .read_distribution import JunctionCache
+from .load_as_event_data import parse_event_line
+from .options import DEFAULT_OPTIONS
+
+RESULT_FIELDS = ('n_inc', 'n_exc', 'p_inc', 'p_exc', 'PSI_standard',
+                 'PSI_bootstrap', 'PSI_bootstrap_std')
+
+# State of a worker process, set up by _init_worker
+_worker = {}
+
+
+def _init_worker(bam_files, cache_size):
+    import pysam
+    _worker['bamfiles'] = [pysam.Samfile(bamfile, check_header=False)
+                           for bamfile in bam_files]
+    _worker['junction_cache'] = JunctionCache(cache_size)
+
+
+def _quantify(job):
+    """Quantify one event in a worker process."""
+
+    event_definition, one_based_pos, options = job
+
+    try:
+        if isinstance(event_definition, basestring):
+            event_args = parse_event_line(event_definition)
+        else:
+            event_args = (event_definition['event_type'],
+                          event_definition['event_id'],
+                          event_definition['chromosome'],
+                          event_definition['strand'],
+                          [tuple(e) for e in event_definition['exons']])
+    except (ValueError, KeyError, TypeError) as e:
+        return {'error': "Malformed event definition: %s" % e}
+
+    try:
+        event = AltSpliceEvent(*event_args, one_based_pos=one_based_pos)
+        event.build_read_distribution(
+            _worker['bamfiles'], options['min_overhang'],
+            options['max_edit_distance'], options['max_num_mapped_loci'],
+            options['library_type'], options['paired_end'],
+            junction_cache=_worker['junction_cache'])
+        psi_event = event.bootstrap_event(
+            options['n_bootstrap_samples'], options['n_grid_points'],
+            options['a'], options['b'], options['r'])
+    except BENTOSeqError as e:
+        return {'event_id': event_args[1], 'error': str(e)}
+    except Exception as e:
+        # e.g. unknown chromosomes or missing tags in the BAM-files;
+        # must not fail the other events of the request
+        logging.debug("Event %s: %r" % (event_args[1], e))
+        return {'event_id': event_args[1],
+                'error': "%s: %s" % (type(e).__name__, e)}
+
+    result = {'event_id': event.event_id}
+    for field, value in zip(RESULT_FIELDS, psi_event):
+        result[field] = value.item() if hasattr(value, 'item') else value
+    return result
+
+
+class LatencyTracker(object):
+    """Keeps the latencies of the most recent requests.
+
+    **Parameters:**
+
+    max_size : int (default=10000)
+        Number of most recent requests to keep.
+
+    """
+
+    def __init__(self, max_size=10000):
+        self._latencies = deque(maxlen=max_size)
+        self._lock = threading.Lock()
+        self.n_requests = 0
+        self.n_events = 0
+
+    def add(self, latency, n_events):
+        with self._lock:
+            self._latencies.append(latency)
+            self.n_requests += 1
+            self.n_events += n_events
+
+    def summary(self):
+        """Return the number of requests and the latency percentiles
+        in seconds."""
+
+        with self._lock:
+            latencies = np.array(self._latencies)
+            summary = {'n_requests': self.n_requests,
+                       'n_events': self.n_events}
+        if latencies.size:
+            for q in (50, 90, 95, 99):
+                summary['p%d' % q] = float(np.percentile(latencies, q))
+            summary['max'] = float(latencies.max())
+        return summary
+
+
+class PSIServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """HTTP server that distributes quantification requests to a pool
+    of worker processes.
+
+    **Parameters:**
+
+    bam_files : list of strings
+        Paths of the BAM-files. Every worker opens its own handles.
+
+    host : string (default='127.0.0.1')
+
+    port : int (default=8765)
+
+    n_workers : int (default=4)
+
+    cache_size : int (default=10000)
+        Maximum number of junction read distributions cached per
+        worker.
+
+    options : dict (optional)
+        Default counting and bootstrap parameters, see
+        :py:data:`bento_seq.options.DEFAULT_OPTIONS`.
+
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, bam_files, host='127.0.0.1', port=8765,
+                 n_workers=4, cache_size=10000, options=None):
+        for bam_file in bam_files:
+            if not os.path.isfile(bam_file):
+                raise IOError("BAM-file not found: %s" % bam_file)
+
+        BaseHTTPServer.HTTPServer.__init__(self, (host, port),
+                                           PSIRequestHandler)
+        self.options = dict(DEFAULT_OPTIONS)
+        if options:
+            self.options.update(options)
+        self.latency = LatencyTracker()
+        self.pool = Pool(n_workers, _init_worker, (bam_files, cache_size))
+
+    def quantify(self, events, one_based_pos=True, options=None):
+        """Quantify a batch of events on the worker pool."""
+
+        job_options = dict(self.options)
+        if options:
+            unknown = set(options) - set(DEFAULT_OPTIONS)
+            if unknown:
+                raise ValueError("Unknown options: %s" %
+                                 ', '.join(sorted(unknown)))
+            job_options.update(options)
+
+        jobs = [(event, one_based_pos, job_options) for event in events]
+        return self.pool.map(_quantify, jobs)
+
+    def server_close(self):
+        BaseHTTPServer.HTTPServer.server_close(self)
+        self.pool.terminate()
+        self.pool.join()
+
+
+class PSIRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        logging.debug("%s - %s" % (self.address_string(), format % args))
+
+    def _send_json(self, status, obj):
+        body = json.dumps(obj)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._send_json(200, self.server.latency.summary())
+        elif self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        else:
+            self._send_json(404, {'error': "Unknown path: %s" % self.path})
+
+    def do_POST(self):
+        if self.path != '/quantify':
+            self._send_json(404, {'error': "Unknown path: %s" % self.path})
+            return
+
+        t0 = time.time()
+        try:
+            length = int(self.headers.getheader('Content-Length', 0))
+            request = json.loads(self.rfile.read(length))
+            events = request['events']
+            if not isinstance(events, list):
+                raise ValueError("'events' must be a list.")
+            results = self.server.quantify(
+                events, request.get('one_based_pos', True),
+                request.get('options'))
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+
+        latency = time.time() - t0
+        self.server.latency.add(latency, len(events))
+        self._send_json(200, {'results': results, 'elapsed': latency})
+
+
+def serve(bam_files, host='127.0.0.1', port=8765, n_workers=4,
+          cache_size=10000, options=None):
+    """Run a :py:class:`PSIServer` until interrupted."""
+
+    server = PSIServer(bam_files, host, port, n_workers, cache_size, options)
+    logging.info("Serving PSI quantification for %s on http://%s:%d/ "
+                 "with %d workers." % (', '.join(bam_files), host, port,
+                                       n_workers))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logging.info("Latency summary: %s" %
+                     json.dumps(server.latency.summary(), sort_keys=True))
+        server.server_close()
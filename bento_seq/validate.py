@@ -0,0 +1,173 @@
+"""Validation of event definition files.
+
+All events are checked in a single pass without reading any
+alignments, so that problems with an event file are found before a
+full run. The checks mirror those of
+:py:class:`bento_seq.alt_splice_event.AltSpliceEvent` and additionally
+compare the chromosome names and coordinates against the headers of the
+BAM-files. Only the standard library is used, so that validation starts
+quickly.
+
+"""
+
+from .load_as_event_data import open_event_file
+
+EVENT_TYPES = ('CAS', 'A5SS', 'A3SS', 'MXE', 'AFE', 'ALE', 'SPR')
+
+# Type-specific exon order, on the transcribed strand with exons as
+# (start, end) in 0-based coordinates, as in AltSpliceEvent
+EXON_ORDER = {
+    'CAS': lambda e: e[1][0] > e[0][1] and e[2][0] > e[1][1],
+    'A5SS': lambda e: e[0][0] == e[1][0] and e[2][0] > e[1][1],
+    'A3SS': lambda e: e[1][1] == e[2][1] and e[1][0] > e[0][1],
+    'MXE': lambda e: (e[1][0] > e[0][1] and e[2][0] > e[0][1] and
+                      e[3][0] > e[2][1]),
+    'AFE': lambda e: e[2][0] > e[0][1] and e[2][0] > e[1][1],
+    'ALE': lambda e: e[1][0] > e[0][1] and e[2][0] > e[0][1],
+    'SPR': lambda e: e[1][0] > e[0][1] and e[2][0] > e[0][1]
+}
+
+
+def _parse_exon(element):
+    start, end = element.split(':')
+    return int(start), int(end)
+
+
+def chromosome_lengths(bamfiles):
+    """Return a dictionary of chromosome lengths from the headers of
+    ``bamfiles``. Chromosomes with different lengths in different
+    files are reported with the smallest length."""
+
+    lengths = {}
+    for bamfile in bamfiles:
+        for chromosome, length in zip(bamfile.references, bamfile.lengths):
+            lengths[chromosome] = min(length, lengths.get(chromosome, length))
+    return lengths
+
+
+def _suggest_chromosome(chromosome, lengths):
+    if chromosome.startswith('chr') and chromosome[3:] in lengths:
+        return chromosome[3:]
+    if 'chr' + chromosome in lengths:
+        return 'chr' + chromosome
+    if chromosome in ('chrM', 'MT') and ('MT' in lengths or 'chrM' in lengths):
+        return 'MT' if 'MT' in lengths else 'chrM'
+    return None
+
+
+def validate_event_file(event_string, one_based_pos=True, lengths=None):
+    """Check all events in an event definitions file.
+
+    **Parameters:**
+
+    event_string : string
+        Path of the event definitions file or a genome identifier.
+
+    one_based_pos : bool (default=True)
+        Whether the exon coordinates are 1-based and closed.
+
+    lengths : dict (optional)
+        Chromosome lengths, *e.g.* from :py:func:`chromosome_lengths`.
+        If given, chromosome names and coordinates are checked against
+        them.
+
+    **Returns:**
+
+    n_events : int
+        Number of events in the file.
+
+    problems : list
+        List of ``(line_number, event_id, message)``, sorted by line
+        number.
+
+    """
+
+    problems = []
+    seen_ids = {}
+    unknown_chromosomes = {}
+    n_events = 0
+    with open_event_file(event_string) as f:
+        for line_number, line in enumerate(f, 1):
+            if line.startswith('#') or not line.strip(): continue
+            n_events += 1
+            elements = line.rstrip('\r\n').split('\t')
+            event_id = elements[1] if len(elements) > 1 else ''
+
+            def report(message):
+                problems.append((line_number, event_id, message))
+
+            if len(elements) < 7:
+                report("Too few columns: %d (at least 7 required)." %
+                       len(elements))
+                continue
+
+            event_type = elements[0].upper()
+            chromosome = elements[2]
+            strand = elements[3]
+            n_exons = 4 if event_type == 'MXE' else 3
+            if len(elements) < 4 + n_exons:
+                report("Too few columns for %s event: %d (at least %d "
+                       "required)." % (event_type, len(elements), 4 + n_exons))
+                continue
+
+            try:
+                exons = [_parse_exon(e) for e in elements[4:4 + n_exons]]
+            except ValueError:
+                report("Malformed exon coordinates: %s (must be "
+                       "'start:end')." % ' '.join(elements[4:4 + n_exons]))
+                continue
+
+            if event_id in seen_ids:
+                report("Duplicate event ID (first in line %d)." %
+                       seen_ids[event_id])
+            else:
+                seen_ids[event_id] = line_number
+
+            known_type = event_type in EVENT_TYPES
+            if not known_type:
+                report("Unknown alternative splicing event type: %s." %
+                       event_type)
+            known_strand = strand in ('+', '-')
+            if not known_strand:
+                report("Unknown strand type: %s (must be '+' or '-')." %
+                       strand)
+
+            # Exon coordinates in 0-based, right-open format
+            if one_based_pos:
+                exons = [(start - 1, end) for start, end in exons]
+
+            empty = any(start >= end for start, end in exons)
+            if empty:
+                report("Exon with end before start.")
+
+            if lengths is not None:
+                if chromosome not in lengths:
+                    if chromosome not in unknown_chromosomes:
+                        unknown_chromosomes[chromosome] = \
+                            _suggest_chromosome(chromosome, lengths)
+                    message = "Chromosome %s not in the BAM-file headers" % \
+                              chromosome
+                    suggestion = unknown_chromosomes[chromosome]
+                    if suggestion is not None:
+                        message += " (did you mean %s?)" % suggestion
+                    report(message + '.')
+                elif any(start < 0 or end > lengths[chromosome]
+                         for start, end in exons):
+                    report("Exon coordinates outside of chromosome %s." %
+                           chromosome)
+
+            if not known_type or not known_strand or empty:
+                continue
+
+            # Coordinates on the transcribed strand, as in AltSpliceEvent
+            if strand == '-':
+                exons = [(-end + 1, -start + 1) for start, end in exons]
+
+            if not ((exons[1][0] > exons[0][0] or exons[1][1] > exons[0][1]) and
+                    (exons[2][0] > exons[1][0] or exons[2][1] > exons[1][1])):
+                report("Exons must be listed from 5' to 3' on the "
+                       "transcribed strand.")
+            elif not EXON_ORDER[event_type](exons):
+                report("Event is not a valid %s event." % event_type)
+
+    return n_events, problems
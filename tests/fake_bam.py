@@ -0,0 +1,50 @@
+"""Stand-ins for the pysam alignment classes, so that reads can be
+counted without BAM-files."""
+
+CIGAR_OPS = {'M': 0, 'I': 1, 'D': 2, 'N': 3, 'S': 4}
+
+
+class FakeRead(object):
+    """The attributes of :py:class:`pysam.AlignedRead` used for
+    counting."""
+
+    def __init__(self, qname, pos, cigarstring, nm=0, nh=1):
+        self.qname = qname
+        self.pos = pos
+        self.cigarstring = cigarstring
+        self.cigar = []
+        length = ''
+        for c in cigarstring:
+            if c.isdigit():
+                length += c
+            else:
+                self.cigar.append((CIGAR_OPS[c], int(length)))
+                length = ''
+        self.rlen = sum(l for op, l in self.cigar if op in (0, 1, 4))
+        self.aend = pos + sum(l for op, l in self.cigar if op in (0, 2, 3))
+        self.tags = [('NM', nm), ('NH', nh)]
+        self.is_reverse = False
+        self.is_read2 = False
+        self.is_paired = False
+        self.mate_is_unmapped = False
+        self.tid = self.mrnm = 0
+        self.mpos = -1
+
+
+class FakeBam(object):
+
+    def __init__(self, chromosome, reads):
+        self.references = (chromosome,)
+        self.lengths = (10000,)
+        self.chromosome = chromosome
+        self.reads = sorted(reads, key=lambda read: read.pos)
+
+    def next(self):
+        return self.reads[0]
+
+    def fetch(self, chromosome, start=None, end=None):
+        for read in self.reads:
+            if chromosome != self.chromosome:
+                continue
+            if start is None or (read.pos < end and read.aend > start):
+                yield read
@@ -0,0 +1,121 @@
+"""Tests of the delta PSI densities and their summaries."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import numpy as np
+    import pysam
+except ImportError:
+    np = None
+
+if np is not None:
+    from bento_seq.diff_psi import delta_psi_pdf, summarize_delta_psi, \
+        write_pdfs, read_pdfs
+
+
+def point_mass(n, i):
+    pdf = np.zeros(n)
+    pdf[i] = 1.
+    return pdf
+
+
+@unittest.skipIf(np is None, "NumPy or pysam is not installed")
+class TestDeltaPSI(unittest.TestCase):
+
+    def test_grid(self):
+        pdf, grid = delta_psi_pdf(np.ones(5) / 5, np.ones(5) / 5)
+        self.assertEqual(pdf.shape, (9,))
+        np.testing.assert_allclose(grid, np.arange(-4, 5) / 5.)
+        self.assertAlmostEqual(pdf.sum(), 1.)
+
+    def test_point_masses(self):
+        n = 10
+        for i, j in ((2, 7), (7, 2), (4, 4), (0, n - 1), (n - 1, 0)):
+            pdf, grid = delta_psi_pdf(point_mass(n, i), point_mass(n, j))
+            expected = np.zeros(2 * n - 1)
+            expected[np.argmin(np.abs(grid - (j - i) / float(n)))] = 1.
+            np.testing.assert_allclose(pdf, expected, atol=1e-10)
+            self.assertAlmostEqual(grid[pdf.argmax()], (j - i) / float(n))
+
+    def test_symmetry(self):
+        random_state = np.random.RandomState(0)
+        pdfs_a = random_state.dirichlet(np.ones(20), 5)
+        pdfs_b = random_state.dirichlet(np.ones(20), 5)
+        pdf_ab, _ = delta_psi_pdf(pdfs_a, pdfs_b)
+        pdf_ba, _ = delta_psi_pdf(pdfs_b, pdfs_a)
+        self.assertEqual(pdf_ab.shape, (5, 39))
+        np.testing.assert_allclose(pdf_ab, pdf_ba[:, ::-1], atol=1e-10)
+
+    def test_rows(self):
+        random_state = np.random.RandomState(1)
+        pdfs_a = random_state.dirichlet(np.ones(8), 3)
+        pdfs_b = random_state.dirichlet(np.ones(8), 3)
+        pdf, _ = delta_psi_pdf(pdfs_a, pdfs_b)
+        for k in range(3):
+            np.testing.assert_allclose(
+                pdf[k], delta_psi_pdf(pdfs_a[k], pdfs_b[k])[0], atol=1e-10)
+
+    def test_shape_mismatch(self):
+        self.assertRaises(ValueError, delta_psi_pdf, np.ones(5), np.ones(6))
+
+    def test_summary(self):
+        grid = np.arange(-4, 5) / 5.
+        uniform = np.ones(9) / 9.
+        # Half of the mass at -0.2 and half at 0.6
+        two_points = np.zeros(9)
+        two_points[3] = two_points[7] = .5
+
+        delta_psi, delta_psi_std, p_change = summarize_delta_psi(
+            np.vstack([uniform, two_points]), grid, thresholds=(0.1, 0.3, 0.7))
+
+        np.testing.assert_allclose(delta_psi, [0., 0.2], atol=1e-10)
+        np.testing.assert_allclose(delta_psi_std,
+                                   [np.sqrt(60 / 225.), 0.4])
+        # |delta_psi| > t for |k| >= 1, 2 and 4 in the uniform density
+        np.testing.assert_allclose(p_change, [[8 / 9., 6 / 9., 2 / 9.],
+                                              [1., .5, 0.]])
+
+    def test_summary_vector(self):
+        pdf, grid = delta_psi_pdf(point_mass(4, 1), point_mass(4, 3))
+        delta_psi, delta_psi_std, p_change = summarize_delta_psi(pdf, grid)
+        np.testing.assert_allclose(delta_psi, [0.5])
+        np.testing.assert_allclose(delta_psi_std, [0.], atol=1e-6)
+        self.assertEqual(p_change.shape, (1, 1))
+        self.assertAlmostEqual(p_change[0, 0], 1.)
+
+
+@unittest.skipIf(np is None, "NumPy or pysam is not installed")
+class TestPDFFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        random_state = np.random.RandomState(2)
+        self.event_ids = ['event%d' % i for i in range(4)]
+        self.pdfs = random_state.dirichlet(np.ones(30), 4)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def round_trip(self, filename):
+        filename = os.path.join(self.tmp_dir, filename)
+        write_pdfs(filename, self.event_ids, self.pdfs)
+        pdfs = read_pdfs(filename)
+        self.assertEqual(sorted(pdfs), self.event_ids)
+        for event_id, pdf in zip(self.event_ids, self.pdfs):
+            np.testing.assert_allclose(pdfs[event_id], pdf, rtol=1e-5)
+        return filename
+
+    def test_round_trip(self):
+        self.round_trip('pdfs.tab')
+
+    def test_round_trip_gzip(self):
+        filename = self.round_trip('pdfs.tab.gz')
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(2), '\x1f\x8b')
+
+
+if __name__ == '__main__':
+    unittest.main()
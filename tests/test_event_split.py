@@ -0,0 +1,84 @@
+"""Tests of splitting event files into shards and merging the
+outputs."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from bento_seq import BENTOSeqError
+from bento_seq.event_split import split_event_file, merge_outputs
+
+EVENTS = ''.join('CAS\tevent%d\tchr%d\t+\t100:200\t300:400\t500:600\n' %
+                 (i, i % 3 + 1) for i in range(12))
+
+
+class TestSplit(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.event_file = os.path.join(self.tmpdir, 'events.tab')
+        with open(self.event_file, 'w') as f:
+            f.write('#header\n' + EVENTS)
+        self.prefix = os.path.join(self.tmpdir, 'shard')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read_events(self, shards):
+        lines = []
+        for shard in shards:
+            with open(shard) as f:
+                lines.extend(line for line in f if not line.startswith('#'))
+        return lines
+
+    def test_balanced(self):
+        shards = split_event_file(self.event_file, self.prefix, 5)
+        self.assertEqual(len(shards), 5)
+        self.assertEqual(sorted(self.read_events(shards)),
+                         sorted(EVENTS.splitlines(True)))
+
+    def test_more_shards_than_chromosomes(self):
+        shards = split_event_file(self.event_file, self.prefix, 5,
+                                  by='chromosome')
+        self.assertEqual(shards, ['%s.%03d.tab' % (self.prefix, i)
+                                  for i in range(5)])
+        for shard in shards:
+            self.assertTrue(os.path.exists(shard))
+        self.assertEqual(len(self.read_events(shards)), 12)
+
+    def test_one_shard_per_chromosome(self):
+        shards = split_event_file(self.event_file, self.prefix,
+                                  by='chromosome')
+        self.assertEqual(len(shards), 3)
+
+    def test_invalid_n_shards(self):
+        for by in ('balanced', 'chromosome'):
+            for n_shards in (0, -1):
+                self.assertRaises(ValueError, split_event_file,
+                                  self.event_file, self.prefix, n_shards, by)
+        self.assertEqual(os.listdir(self.tmpdir), ['events.tab'])
+
+    def test_merge(self):
+        shards = split_event_file(self.event_file, self.prefix, 4)
+        outputs = []
+        for shard in shards:
+            output = shard + '.out'
+            with open(output, 'w') as f:
+                f.write('#ID\tPSI\n')
+                for line in self.read_events([shard]):
+                    f.write('%s\t0.5\n' % line.split('\t')[1])
+            outputs.append(output)
+
+        merged = os.path.join(self.tmpdir, 'merged.tab')
+        self.assertEqual(merge_outputs(self.event_file, outputs, merged), [])
+        with open(merged) as f:
+            self.assertEqual([line.split('\t')[0] for line in f][1:],
+                             ['event%d' % i for i in range(12)])
+
+        self.assertRaises(BENTOSeqError, merge_outputs, self.event_file,
+                          outputs[1:], merged)
+
+
+if __name__ == '__main__':
+    unittest.main()
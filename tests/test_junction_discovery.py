@@ -0,0 +1,86 @@
+"""Tests of the junction table against counting from the BAM-files."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from bento_seq import BENTOSeqError
+from bento_seq.read_distribution import ReadDistribution
+from bento_seq.junction_discovery import discover_junctions, \
+    JunctionTableCache, read_table_parameters
+
+from fake_bam import FakeRead, FakeBam
+
+READS = [
+    FakeRead('r1', 80, '20M100N30M'),
+    FakeRead('r2', 90, '10M100N40M'),
+    FakeRead('r3', 70, '30M100N10M150N10M'),
+    FakeRead('r4', 85, '10M5D5M100N35M'),    # deletion before the junction
+    FakeRead('r5', 95, '5M100N45M', nm=5),   # edit distance
+    FakeRead('r6', 60, '40M300N10M'),
+    FakeRead('r7', 100, '50M'),
+]
+
+# Read distributions of READS, with the position of a read relative to
+# the junction as the negative length of the aligned blocks up to it
+EXPECTED = {
+    ('chr1', 100, 200): {-20: 1, -10: 1, -30: 1},   # r1, r2, r3
+    ('chr1', 105, 205): {-20: 1},                   # r4, deletion merged
+    ('chr1', 100, 400): {-40: 1},                   # r6
+    ('chr1', 210, 360): {-40: 1},                   # r3, second junction
+    ('chr1', 500, 600): {}
+}
+JUNCTIONS = sorted(EXPECTED)
+
+
+class TestJunctionTable(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.table = os.path.join(self.tmpdir, 'junctions.tab.gz')
+        self.bamfiles = [FakeBam('chr1', READS)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_parameters(self):
+        discover_junctions(self.bamfiles, self.table, max_edit_distance=3)
+        self.assertEqual(read_table_parameters(self.table),
+                         (3, 1, 'unstranded', False))
+
+    def test_from_junction(self):
+        for junction, expected in EXPECTED.items():
+            read_distribution = ReadDistribution.from_junction(
+                self.bamfiles, junction)
+            self.assertEqual(read_distribution.to_dict(), expected,
+                             "junction %s:%d-%d" % junction)
+            self.assertEqual(read_distribution.read_length, 50)
+
+    def test_table(self):
+        discover_junctions(self.bamfiles, self.table)
+        cache = JunctionTableCache(self.table)
+        for junction, expected in EXPECTED.items():
+            read_distribution = cache.get(
+                (junction, 2, 1, 'unstranded', None, False))
+            self.assertEqual(read_distribution.to_dict(), expected,
+                             "junction %s:%d-%d" % junction)
+
+    def test_same_as_bam(self):
+        discover_junctions(self.bamfiles, self.table)
+        cache = JunctionTableCache(self.table)
+        for junction in JUNCTIONS:
+            expected = ReadDistribution.from_junction(self.bamfiles, junction)
+            actual = cache.get((junction, 2, 1, 'unstranded', None, False))
+            self.assertEqual(actual.to_dict(), expected.to_dict())
+            self.assertEqual(actual.read_length, expected.read_length)
+
+    def test_different_filters(self):
+        discover_junctions(self.bamfiles, self.table)
+        cache = JunctionTableCache(self.table)
+        self.assertRaises(BENTOSeqError, cache.get,
+                          (JUNCTIONS[0], 5, 1, 'unstranded', None, False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+"""Tests of the event set download against a local HTTP server.
+
+Run with ``python -m unittest discover tests`` from the top-level
+directory.
+
+"""
+
+import os
+import gzip
+import shutil
+import hashlib
+import tempfile
+import unittest
+import threading
+import BaseHTTPServer
+from StringIO import StringIO
+
+from bento_seq import load_as_event_data
+
+EVENTS = ''.join('CAS\tevent%d\tchr1\t+\t100:200\t300:400\t500:600\n' % i
+                 for i in range(1000))
+
+
+def _gzip(data):
+    buf = StringIO()
+    f = gzip.GzipFile(fileobj=buf, mode='wb')
+    f.write(data)
+    f.close()
+    return buf.getvalue()
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serves ``server.files`` and supports range requests. If
+    ``server.truncate`` is set, the connection of the next response is
+    closed after that many bytes of the body."""
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get('Range')))
+        data = self.server.files.get(self.path)
+        if data is None:
+            self.send_error(404)
+            return
+
+        range_header = self.headers.get('Range')
+        if range_header:
+            offset = int(range_header.split('=')[1].rstrip('-'))
+            if offset >= len(data):
+                self.send_error(416)
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' %
+                             (offset, len(data) - 1, len(data)))
+            data = data[offset:]
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if self.server.truncate is not None:
+            data = data[:self.server.truncate]
+            self.server.truncate = None
+            self.close_connection = 1
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestFetch(unittest.TestCase):
+
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), _Handler)
+        self.server.files = {}
+        self.server.requests = []
+        self.server.truncate = None
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        self.data = _gzip(EVENTS)
+        self.server.files['/test.tab.gz'] = self.data
+        url = 'http://127.0.0.1:%d/test.tab.gz' % self.server.server_port
+        load_as_event_data.AS_EVENTS['test'] = url
+
+        self.old_data_home = load_as_event_data.DATA_HOME
+        self.data_home = tempfile.mkdtemp()
+        load_as_event_data.set_data_home(self.data_home)
+        self.dest = os.path.join(self.data_home, 'test.tab.gz')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        del load_as_event_data.AS_EVENTS['test']
+        load_as_event_data.DATA_HOME = self.old_data_home
+        shutil.rmtree(self.data_home)
+
+    def read_dest(self):
+        with open(self.dest, 'rb') as f:
+            return f.read()
+
+    def test_download(self):
+        self.assertEqual(load_as_event_data.fetch('test'), self.dest)
+        self.assertEqual(self.read_dest(), self.data)
+        self.assertFalse(os.path.exists(self.dest + '.part'))
+
+        # A verified file is not downloaded again
+        n_requests = len(self.server.requests)
+        load_as_event_data.fetch('test')
+        self.assertEqual(len(self.server.requests), n_requests)
+
+    def test_checksum(self):
+        self.server.files['/test.tab.gz.md5'] = \
+            hashlib.md5(self.data).hexdigest() + '  test.tab.gz\n'
+        load_as_event_data.fetch('test')
+        self.assertEqual(self.read_dest(), self.data)
+
+    def test_checksum_mismatch(self):
+        self.server.files['/test.tab.gz.md5'] = '0' * 32 + '\n'
+        self.assertRaises(IOError, load_as_event_data.fetch, 'test')
+        self.assertFalse(os.path.exists(self.dest))
+        self.assertFalse(os.path.exists(self.dest + '.part'))
+
+    def test_resume(self):
+        offset = len(self.data) // 2
+        with open(self.dest + '.part', 'wb') as f:
+            f.write(self.data[:offset])
+
+        load_as_event_data.fetch('test')
+        self.assertEqual(self.read_dest(), self.data)
+        self.assertIn(('/test.tab.gz', 'bytes=%d-' % offset),
+                      self.server.requests)
+
+    def test_connection_closed(self):
+        offset = len(self.data) // 3
+        self.server.truncate = offset
+        self.assertRaises(IOError, load_as_event_data.fetch, 'test')
+        self.assertFalse(os.path.exists(self.dest))
+        self.assertEqual(os.path.getsize(self.dest + '.part'), offset)
+
+        load_as_event_data.fetch('test')
+        self.assertEqual(self.read_dest(), self.data)
+        self.assertEqual(self.server.requests[-1],
+                         ('/test.tab.gz', 'bytes=%d-' % offset))
+
+    def test_resume_complete(self):
+        with open(self.dest + '.part', 'wb') as f:
+            f.write(self.data)
+
+        load_as_event_data.fetch('test')
+        self.assertEqual(self.read_dest(), self.data)
+
+    def test_corrupted_cache(self):
+        # Truncated file left by an interrupted non-atomic download
+        with open(self.dest, 'wb') as f:
+            f.write(self.data[:len(self.data) // 2])
+
+        load_as_event_data.fetch('test')
+        self.assertEqual(self.read_dest(), self.data)
+        with load_as_event_data.open_event_file('test') as f:
+            self.assertEqual(f.read(), EVENTS)
+
+    def test_valid_cache(self):
+        with open(self.dest, 'wb') as f:
+            f.write(self.data)
+
+        load_as_event_data.fetch('test')
+        self.assertEqual(self.server.requests, [])
+        self.assertTrue(os.path.exists(self.dest + '.verified'))
+
+
+if __name__ == '__main__':
+    unittest.main()
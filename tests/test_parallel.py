@@ -0,0 +1,66 @@
+"""Tests of the concurrent quantification API with events that do not
+read any BAM-files."""
+
+import os
+import signal
+import unittest
+
+try:
+    import pysam
+except ImportError:
+    pysam = None
+
+from bento_seq.parallel import EventQuantifier
+
+
+class FakeEvent(object):
+
+    def __init__(self, event_id, kill_worker=False):
+        self.event_id = event_id
+        self.kill_worker = kill_worker
+
+    def build_read_distribution(self, *args):
+        pass
+
+    def bootstrap_event(self, *args):
+        if self.kill_worker:
+            os.kill(os.getpid(), signal.SIGKILL)
+        return self.event_id
+
+
+def events_then_error(n_events):
+    for i in range(n_events):
+        yield FakeEvent(i)
+    raise ValueError("Malformed event")
+
+
+@unittest.skipIf(pysam is None, "pysam is not installed")
+class TestEventQuantifier(unittest.TestCase):
+
+    def setUp(self):
+        self.quantifier = EventQuantifier([], n_io_threads=2, n_cpu_workers=2,
+                                          max_in_flight=4)
+
+    def tearDown(self):
+        self.quantifier.close()
+
+    def test_results(self):
+        results = dict(self.quantifier.imap_unordered(
+            FakeEvent(i) for i in range(20)))
+        self.assertEqual(results, dict((i, i) for i in range(20)))
+
+    def test_iterator_error(self):
+        results = []
+        with self.assertRaises(ValueError):
+            for item in self.quantifier.imap_unordered(events_then_error(5)):
+                results.append(item)
+        self.assertEqual(sorted(results), [(i, i) for i in range(5)])
+
+    def test_worker_died(self):
+        events = [FakeEvent(0), FakeEvent(1, kill_worker=True), FakeEvent(2)]
+        with self.assertRaises(RuntimeError):
+            list(self.quantifier.imap_unordered(events))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+"""Tests of the per-event profiler."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if np is not None:
+    from bento_seq.profiling import EventProfiler
+
+
+def draw(n):
+    return np.random.rand(n)
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class TestEventProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.profile_dir)
+
+    def test_slowest(self):
+        profiler = EventProfiler(top_k=2)
+        for event_id, elapsed in (('a', 1.), ('b', 3.), ('c', 2.)):
+            profiler.record(event_id, elapsed, 10, 5)
+        self.assertEqual([event[0] for event in profiler.slowest], ['b', 'c'])
+
+    def test_should_profile(self):
+        self.assertFalse(EventProfiler().should_profile(100.))
+        profiler = EventProfiler(profile_threshold=1.,
+                                 profile_dir=self.profile_dir)
+        self.assertFalse(profiler.should_profile(.5))
+        self.assertTrue(profiler.should_profile(1.5))
+
+    def test_random_state(self):
+        profiler = EventProfiler(profile_threshold=0.,
+                                 profile_dir=self.profile_dir)
+        np.random.seed(0)
+        expected = draw(10)
+        np.random.seed(0)
+        profiler.profile('event/1', draw, 5)
+        self.assertTrue(np.all(draw(10) == expected))
+        self.assertTrue(os.path.exists(
+            os.path.join(self.profile_dir, 'event_1.prof')))
+        self.assertEqual(profiler.n_profiled, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,271 @@
+"""Tests of counting reads by strand and of counting read pairs with
+the mate lookup."""
+
+import unittest
+
+try:
+    import numpy as np
+    import pysam
+except ImportError:
+    np = None
+
+from bento_seq.read_distribution import ReadDistribution, MateLookup, \
+    JunctionCache, get_transcript_strand
+from bento_seq.junction_discovery import discover_chromosome
+
+if np is not None:
+    from bento_seq.alt_splice_event import AltSpliceEvent
+
+from fake_bam import FakeRead, FakeBam
+
+
+def stranded(read, is_read2, is_reverse):
+    read.is_read2 = is_read2
+    read.is_reverse = is_reverse
+    return read
+
+
+def paired(read, mpos, is_read2=False):
+    read.is_paired = True
+    read.mpos = mpos
+    read.is_read2 = is_read2
+    read.is_reverse = is_read2
+    return read
+
+
+def mates(qname, pos, mpos):
+    """Two reads of pair ``qname`` without junctions at ``pos`` and
+    ``mpos``."""
+
+    return (paired(FakeRead(qname, pos, '50M'), mpos),
+            paired(FakeRead(qname, mpos, '50M'), pos, True))
+
+
+# p1: both mates span 100-200; p2: the mates span different junctions
+PAIRS = [
+    paired(FakeRead('p1', 80, '20M100N30M'), 90),
+    paired(FakeRead('p1', 90, '10M100N40M'), 80, True),
+    paired(FakeRead('p2', 60, '40M300N10M'), 150),
+    paired(FakeRead('p2', 150, '10M100N40M'), 60, True),
+]
+
+
+# Transcript strand by (library_type, is_read2, is_reverse)
+STRANDS = {
+    ('fr-firststrand', False, False): '-',
+    ('fr-firststrand', False, True): '+',
+    ('fr-firststrand', True, False): '+',
+    ('fr-firststrand', True, True): '-',
+    ('fr-secondstrand', False, False): '+',
+    ('fr-secondstrand', False, True): '-',
+    ('fr-secondstrand', True, False): '-',
+    ('fr-secondstrand', True, True): '+',
+}
+
+# One read per combination of read1/read2 and forward/reverse across
+# 100-200, told apart by their positions relative to the junction
+STRANDED_READS = [
+    stranded(FakeRead('s1', 80, '20M100N30M'), False, False),   # -20
+    stranded(FakeRead('s2', 85, '15M100N35M'), False, True),    # -15
+    stranded(FakeRead('s3', 90, '10M100N40M'), True, False),    # -10
+    stranded(FakeRead('s4', 75, '25M100N25M'), True, True),     # -25
+]
+
+# Read distributions of STRANDED_READS at 100-200 by (library_type,
+# strand)
+STRANDED_EXPECTED = {
+    ('fr-firststrand', '+'): {-15: 1, -10: 1},
+    ('fr-firststrand', '-'): {-20: 1, -25: 1},
+    ('fr-secondstrand', '+'): {-20: 1, -25: 1},
+    ('fr-secondstrand', '-'): {-15: 1, -10: 1},
+    ('fr-firststrand', None): {-20: 1, -15: 1, -10: 1, -25: 1},
+    ('unstranded', '+'): {-20: 1, -15: 1, -10: 1, -25: 1},
+}
+
+
+class TestStrand(unittest.TestCase):
+
+    def test_transcript_strand(self):
+        for (library_type, is_read2, is_reverse), strand in STRANDS.items():
+            read = stranded(FakeRead('r', 80, '50M'), is_read2, is_reverse)
+            self.assertEqual(get_transcript_strand(read, library_type), strand,
+                             "%s, read%d, %s" %
+                             (library_type, 1 + is_read2,
+                              'reverse' if is_reverse else 'forward'))
+
+    def test_unstranded(self):
+        for is_read2 in (False, True):
+            for is_reverse in (False, True):
+                read = stranded(FakeRead('r', 80, '50M'), is_read2, is_reverse)
+                self.assertIsNone(get_transcript_strand(read, 'unstranded'))
+
+    def test_unknown_library_type(self):
+        self.assertRaises(ValueError, get_transcript_strand,
+                          FakeRead('r', 80, '50M'), 'fr-unstranded')
+
+    def test_from_junction(self):
+        bamfiles = [FakeBam('chr1', STRANDED_READS)]
+        for (library_type, strand), expected in STRANDED_EXPECTED.items():
+            read_distribution = ReadDistribution.from_junction(
+                bamfiles, ('chr1', 100, 200), library_type=library_type,
+                strand=strand)
+            self.assertEqual(read_distribution.to_dict(), expected,
+                             "%s, strand %s" % (library_type, strand))
+
+
+@unittest.skipIf(np is None, "NumPy or pysam is not installed")
+class TestJunctionCacheKeys(unittest.TestCase):
+
+    def setUp(self):
+        self.bamfiles = [FakeBam('chr1', STRANDED_READS)]
+        # The same exons on both strands, listed from 5' to 3'
+        self.events = [
+            AltSpliceEvent('CAS', 'plus', 'chr1', '+',
+                           [(50, 100), (200, 250), (350, 400)]),
+            AltSpliceEvent('CAS', 'minus', 'chr1', '-',
+                           [(350, 400), (200, 250), (50, 100)])]
+
+    def build(self, library_type, junction_cache):
+        for event in self.events:
+            event.build_read_distribution(
+                self.bamfiles, library_type=library_type,
+                junction_cache=junction_cache)
+
+    def test_stranded(self):
+        junction_cache = JunctionCache()
+        self.build('fr-firststrand', junction_cache)
+        self.assertEqual(len(junction_cache), 6)
+        self.assertEqual(junction_cache.hits, 0)
+        for strand in ('+', '-'):
+            key = (('chr1', 100, 200), 2, 1, 'fr-firststrand', strand, False)
+            self.assertEqual(junction_cache.get(key).to_dict(),
+                             STRANDED_EXPECTED[('fr-firststrand', strand)])
+
+    def test_unstranded(self):
+        junction_cache = JunctionCache()
+        self.build('unstranded', junction_cache)
+        self.assertEqual(len(junction_cache), 3)
+        self.assertEqual(junction_cache.hits, 3)
+        key = (('chr1', 100, 200), 2, 1, 'unstranded', None, False)
+        self.assertEqual(junction_cache.get(key).to_dict(),
+                         STRANDED_EXPECTED[('unstranded', '+')])
+
+
+class TestPairedEnd(unittest.TestCase):
+
+    def setUp(self):
+        self.bamfiles = [FakeBam('chr1', PAIRS)]
+
+    def test_from_junction(self):
+        for paired_end, expected in ((False, {-20: 1, -10: 1}),
+                                     (True, {-20: 1})):
+            read_distribution = ReadDistribution.from_junction(
+                self.bamfiles, ('chr1', 100, 200), paired_end=paired_end)
+            self.assertEqual(read_distribution.to_dict(), expected)
+
+        for junction, expected in ((('chr1', 100, 400), {-40: 1}),
+                                   (('chr1', 160, 260), {-10: 1})):
+            read_distribution = ReadDistribution.from_junction(
+                self.bamfiles, junction, paired_end=True)
+            self.assertEqual(read_distribution.to_dict(), expected)
+
+    def test_discover_chromosome(self):
+        for paired_end, n_reads in ((False, 2), (True, 1)):
+            read_distributions = discover_chromosome(
+                self.bamfiles, 'chr1', paired_end=paired_end)
+            self.assertEqual(
+                dict((key, sum(rd.to_dict().values()))
+                     for key, rd in read_distributions.items()),
+                {(100, 200, '.'): n_reads, (100, 400, '.'): 1,
+                 (160, 260, '.'): 1})
+
+
+class TestMateLookup(unittest.TestCase):
+
+    def test_pop_mate(self):
+        lookup = MateLookup()
+        read, mate = mates('a', 10, 50)
+        lookup.add(read)
+        self.assertEqual(len(lookup), 1)
+        self.assertTrue(lookup.pop_mate(mate))
+        self.assertEqual(len(lookup), 0)
+        self.assertFalse(lookup.pop_mate(mate))
+
+    def test_extra_key(self):
+        lookup = MateLookup()
+        read, mate = mates('a', 10, 50)
+        lookup.add(read, (100, 200))
+        self.assertFalse(lookup.pop_mate(mate, (300, 400)))
+        self.assertTrue(lookup.pop_mate(mate, (100, 200)))
+
+    def test_unpaired(self):
+        lookup = MateLookup()
+        read = FakeRead('a', 10, '50M')
+        lookup.add(read)
+        self.assertEqual(len(lookup), 0)
+
+        read, mate = mates('b', 10, 50)
+        read.mrnm = 1
+        lookup.add(read)
+        self.assertEqual(len(lookup), 0)
+
+        read, mate = mates('c', 10, 50)
+        read.mate_is_unmapped = True
+        lookup.add(read)
+        self.assertEqual(len(lookup), 0)
+
+    def test_mate_before_read(self):
+        # The mate was fetched first and is not remembered again
+        lookup = MateLookup()
+        read, mate = mates('a', 10, 50)
+        lookup.add(mate)
+        self.assertEqual(len(lookup), 0)
+
+    def test_same_position(self):
+        lookup = MateLookup()
+        read, mate = mates('a', 50, 50)
+        lookup.add(read)
+        self.assertEqual(len(lookup), 1)
+        self.assertTrue(lookup.pop_mate(mate))
+
+    def test_expiry(self):
+        lookup = MateLookup()
+        read, mate = mates('a', 10, 50)
+        lookup.add(read)
+
+        # Not expired while the fetch is at the position of the mate
+        lookup.pop_mate(FakeRead('b', 50, '50M'))
+        self.assertEqual(len(lookup), 1)
+
+        lookup.pop_mate(FakeRead('b', 51, '50M'))
+        self.assertEqual(len(lookup), 0)
+        self.assertEqual(lookup._heap, [])
+
+    def test_max_size(self):
+        lookup = MateLookup(max_size=2)
+        pairs = [mates(qname, 5, mpos)
+                 for qname, mpos in (('a', 30), ('b', 10), ('c', 20))]
+        for read, mate in pairs:
+            lookup.add(read)
+        self.assertEqual(len(lookup), 2)
+
+        # The read with the smallest mate position is forgotten
+        self.assertFalse(lookup.pop_mate(pairs[1][1]))
+        self.assertTrue(lookup.pop_mate(pairs[2][1]))
+        self.assertTrue(lookup.pop_mate(pairs[0][1]))
+
+    def test_compaction(self):
+        lookup = MateLookup(max_size=3)
+        remembered = mates('a', 0, 1000)
+        lookup.add(remembered[0])
+        for i in range(100):
+            read, mate = mates('r%d' % i, 0, 500)
+            lookup.add(read)
+            self.assertTrue(lookup.pop_mate(mate))
+            self.assertLessEqual(len(lookup._heap), 2 * lookup.max_size)
+        self.assertEqual(len(lookup), 1)
+        self.assertTrue(lookup.pop_mate(remembered[1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
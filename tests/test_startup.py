@@ -0,0 +1,90 @@
+"""Tests that the light-weight commands of ``bin/bento-seq`` start
+without importing pysam or NumPy.
+
+"""
+
+import os
+import sys
+import unittest
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI = os.path.join(ROOT_DIR, 'bin', 'bento-seq')
+
+HEAVY_MODULES = ('numpy', 'pysam')
+
+# Runs the CLI in a fresh interpreter and writes the heavy modules that
+# were imported, or that an import was attempted of, to stderr. The
+# attempts are recorded so that the test does not depend on whether the
+# modules are installed.
+IMPORT_CHECK = """
+import sys, imp
+
+class RecordImports(object):
+    attempted = set()
+
+    def find_module(self, fullname, path=None):
+        if fullname.split('.')[0] in %(heavy)r:
+            self.attempted.add(fullname.split('.')[0])
+        return None
+
+sys.meta_path.insert(0, RecordImports())
+sys.argv = ['bento-seq'] + sys.argv[1:]
+cli = imp.load_source('bento_seq_cli', %(cli)r)
+try:
+    cli.main()
+except SystemExit:
+    pass
+except ImportError as e:
+    # A heavy module that is not installed
+    sys.stderr.write('%%s\\n' %% e)
+imported = RecordImports.attempted.union(
+    m for m in %(heavy)r if m in sys.modules)
+sys.stderr.write('\\nIMPORTED: ' + ' '.join(sorted(imported)) + '\\n')
+""" % {'cli': CLI, 'heavy': HEAVY_MODULES}
+
+
+def heavy_imports(args):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ROOT_DIR] + filter(None, [env.get('PYTHONPATH')]))
+    process = subprocess.Popen([sys.executable, '-c', IMPORT_CHECK] + args,
+                               env=env, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+    stderr = process.communicate()[1]
+    for line in stderr.splitlines():
+        if line.startswith('IMPORTED:'):
+            return line.split()[1:]
+    raise AssertionError("bento-seq %s failed:\n%s" % (' '.join(args), stderr))
+
+
+class TestStartup(unittest.TestCase):
+
+    def assertNoHeavyImports(self, *args):
+        imported = heavy_imports(list(args))
+        self.assertEqual(imported, [],
+                         "'bento-seq %s' imports %s" %
+                         (' '.join(args), ', '.join(imported)))
+
+    def test_help(self):
+        self.assertNoHeavyImports('--help')
+
+    def test_fetch_help(self):
+        self.assertNoHeavyImports('fetch', '--help')
+
+    def test_split_help(self):
+        self.assertNoHeavyImports('split', '--help')
+
+    def test_merge_help(self):
+        self.assertNoHeavyImports('merge', '--help')
+
+    def test_validate_help(self):
+        self.assertNoHeavyImports('validate', '--help')
+
+    def test_validate(self):
+        self.assertNoHeavyImports(
+            'validate', os.path.join(ROOT_DIR, 'examples', 'events_chr21.tab'))
+
+
+if __name__ == '__main__':
+    unittest.main()
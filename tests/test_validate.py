@@ -0,0 +1,63 @@
+"""Tests of the validation of event definition files."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from bento_seq.validate import validate_event_file
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EVENTS = """#type\tid\tchromosome\tstrand\texons
+CAS\tok\tchr1\t+\t100:200\t300:400\t500:600
+CAS\tunordered\tchr1\t+\t500:600\t300:400\t100:200
+CAS\tok_minus\tchr1\t-\t500:600\t300:400\t100:200
+MXE\tmissing_exon\tchr1\t+\t100:200\t300:400\t500:600
+MXE\tok_mxe\tchr1\t+\t100:200\t300:400\t500:600\t700:800
+A5SS\tinvalid_a5ss\tchr1\t+\t100:200\t110:250\t500:600
+A5SS\tok_a5ss\tchr1\t+\t100:200\t100:250\t500:600
+CAS\tout_of_bounds\tchr1\t+\t100:200\t300:400\t500:1600
+CAS\tno_prefix\t1\t+\t100:200\t300:400\t500:600
+XYZ\tunknown_type\tchr1\t+\t100:200\t300:400\t500:600
+CAS\tunknown_strand\tchr1\t.\t100:200\t300:400\t500:600
+CAS\tmalformed\tchr1\t+\t100:a\t300:400\t500:600
+CAS\tok\tchr1\t+\t100:200\t300:400\t500:600
+"""
+
+
+class TestValidate(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.event_file = os.path.join(self.tmpdir, 'events.tab')
+        with open(self.event_file, 'w') as f:
+            f.write(EVENTS)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_problems(self):
+        n_events, problems = validate_event_file(
+            self.event_file, lengths={'chr1': 1000})
+        self.assertEqual(n_events, 13)
+        self.assertEqual(
+            [(line_number, event_id) for line_number, event_id, _ in problems],
+            [(3, 'unordered'), (5, 'missing_exon'), (7, 'invalid_a5ss'),
+             (9, 'out_of_bounds'), (10, 'no_prefix'), (11, 'unknown_type'),
+             (12, 'unknown_strand'), (13, 'malformed'), (14, 'ok')])
+        self.assertIn('did you mean chr1?', problems[4][2])
+
+    def test_without_lengths(self):
+        n_events, problems = validate_event_file(self.event_file)
+        self.assertNotIn('out_of_bounds', [p[1] for p in problems])
+        self.assertNotIn('no_prefix', [p[1] for p in problems])
+
+    def test_example(self):
+        n_events, problems = validate_event_file(
+            os.path.join(ROOT_DIR, 'examples', 'events_chr21.tab'))
+        self.assertEqual(problems, [])
+
+
+if __name__ == '__main__':
+    unittest.main()